@@ -0,0 +1,144 @@
+"""Load test utils.database.Database against a local Postgres.
+
+Compares the old single-connection access pattern with the pooled Database on a
+mixed /tyd workload (assign_role + get_messages_for_range). Tables are created in a
+throwaway schema, so it is safe to point at a development database:
+
+    DB_HOST=localhost DB_NAME=postgres DB_USER=postgres DB_PASSWORD=postgres \
+        python -m benchmarks.db_load --requests 2000 --concurrency 100
+"""
+import argparse
+import asyncio
+import os
+import time
+from datetime import datetime, timedelta
+
+import asyncpg
+
+from utils.database import Database
+
+SCHEMA = "dull_bench"
+RANGE_KEYS = ["0", "1", "2-10", "11-29", "50", "66", "77", "100", "101", "default"]
+
+
+def connect_kwargs():
+    return dict(
+        database=os.environ.get('DB_NAME', 'dulldb'),
+        user=os.environ.get('DB_USER', 'dullfox'),
+        password=os.environ.get('DB_PASSWORD', '1324'),
+        host=os.environ.get('DB_HOST', 'localhost'),
+    )
+
+
+async def setup_schema():
+    conn = await asyncpg.connect(**connect_kwargs())
+    await conn.execute(f"""
+        DROP SCHEMA IF EXISTS {SCHEMA} CASCADE;
+        CREATE SCHEMA {SCHEMA};
+        CREATE TABLE {SCHEMA}.roles (
+            user_id BIGINT NOT NULL,
+            role TEXT NOT NULL,
+            time_assigned TIMESTAMP NOT NULL,
+            expiration TIMESTAMP NOT NULL,
+            PRIMARY KEY (user_id, role)
+        );
+        CREATE TABLE {SCHEMA}.phrases (range_key TEXT NOT NULL, message TEXT NOT NULL);
+    """)
+    await conn.executemany(f"INSERT INTO {SCHEMA}.phrases (range_key, message) VALUES ($1, $2)",
+                           [(key, f"{{user_mention}} phrase {n} for {key}") for key in RANGE_KEYS for n in range(20)])
+    await conn.close()
+
+
+async def drop_schema():
+    conn = await asyncpg.connect(**connect_kwargs())
+    await conn.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+    await conn.close()
+
+
+class SingleConnection:
+    # The pre-pool Database: one connection, every call goes through it.
+    def __init__(self):
+        self.conn = None
+
+    async def connect(self):
+        if self.conn is None or self.conn.is_closed():
+            self.conn = await asyncpg.connect(server_settings={'search_path': SCHEMA}, **connect_kwargs())
+
+    async def assign_role(self, user_id, role_name, expiration):
+        await self.connect()
+        await self.conn.execute("""
+            INSERT INTO roles (user_id, role, time_assigned, expiration) VALUES ($1, $2, NOW(), $3)
+            ON CONFLICT (user_id, role) DO UPDATE SET time_assigned = NOW(), expiration = $4
+        """, user_id, role_name, expiration, expiration)
+
+    async def get_messages_for_range(self, range_key):
+        await self.connect()
+        records = await self.conn.fetch("SELECT message FROM phrases WHERE range_key = $1", range_key)
+        return [record['message'] for record in records]
+
+    async def close(self):
+        if self.conn is not None:
+            await self.conn.close()
+
+
+async def run_workload(db, requests, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    errors = 0
+    expiration = datetime.now() + timedelta(days=1)
+
+    async def one(i):
+        nonlocal errors
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                await db.assign_role(i, "Средний класс", expiration)
+                await db.get_messages_for_range(RANGE_KEYS[i % len(RANGE_KEYS)])
+            except asyncpg.InterfaceError:
+                # "another operation is in progress" on the shared connection
+                errors += 1
+                return
+            latencies.append(time.perf_counter() - start)
+
+    await db.connect()
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        'throughput': len(latencies) / elapsed,
+        'p50_ms': latencies[len(latencies) // 2] * 1000 if latencies else None,
+        'p99_ms': latencies[int(len(latencies) * 0.99)] * 1000 if latencies else None,
+        'errors': errors,
+    }
+
+
+def report(name, result):
+    p50 = f"{result['p50_ms']:.1f}" if result['p50_ms'] is not None else "-"
+    p99 = f"{result['p99_ms']:.1f}" if result['p99_ms'] is not None else "-"
+    print(f"{name:<18} {result['throughput']:>10.1f} req/s   p50 {p50:>7} ms   p99 {p99:>7} ms   errors {result['errors']}")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=100)
+    parser.add_argument('--pool-size', type=int, default=10)
+    args = parser.parse_args()
+
+    os.environ.setdefault('DB_HOST', 'localhost')
+    await setup_schema()
+    try:
+        single = SingleConnection()
+        report("single connection", await run_workload(single, args.requests, args.concurrency))
+        await single.close()
+
+        pooled = Database(min_size=args.pool_size, max_size=args.pool_size, server_settings={'search_path': SCHEMA})
+        report(f"pool ({args.pool_size})", await run_workload(pooled, args.requests, args.concurrency))
+        await pooled.close()
+    finally:
+        await drop_schema()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,413 @@
+"""Offline stand-ins for Discord, yt-dlp, Spotify and PostgreSQL used by the benchmark suite.
+
+Every external round trip is an ``asyncio.sleep`` (or ``time.sleep`` inside yt-dlp worker threads)
+of a configurable latency, so scenarios measure the bot's own scheduling and CPU cost on top of a
+known, repeatable network.
+"""
+import asyncio
+import hashlib
+import itertools
+import threading
+import time
+from urllib.parse import parse_qs, urlparse
+
+_ids = itertools.count(10 ** 17)
+
+
+class FakeHTTP:
+    # One Discord REST round trip; counts calls so scenarios can report API usage.
+    def __init__(self, latency=0.05):
+        self.latency = latency
+        self.calls = 0
+
+    async def request(self):
+        self.calls += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+
+class FakeMessage:
+    def __init__(self, http, embed=None, view=None, content=None):
+        self.http = http
+        self.embed = embed
+        self.view = view
+        self.content = content
+        self.edits = 0
+
+    async def edit(self, embed=None, view=None, content=None, **kwargs):
+        await self.http.request()
+        self.embed = embed or self.embed
+        self.view = view or self.view
+        self.content = content or self.content
+        self.edits += 1
+        return self
+
+
+class FakeTextChannel:
+    def __init__(self, http):
+        self.http = http
+        self.id = next(_ids)
+        self.sent = []
+
+    async def send(self, content=None, embed=None, view=None, **kwargs):
+        await self.http.request()
+        message = FakeMessage(self.http, embed, view, content)
+        self.sent.append(message)
+        return message
+
+
+class FakeRole:
+    def __init__(self, name):
+        self.id = next(_ids)
+        self.name = name
+
+    def __repr__(self):
+        return f"<FakeRole name={self.name!r}>"
+
+
+class FakeVoiceState:
+    def __init__(self, channel):
+        self.channel = channel
+
+
+class FakeMember:
+    def __init__(self, http, guild=None, bot=False, voice_channel=None):
+        self.http = http
+        self.id = next(_ids)
+        self.guild = guild
+        self.bot = bot
+        self.roles = []
+        self.voice = FakeVoiceState(voice_channel) if voice_channel else None
+
+    @property
+    def mention(self):
+        return f"<@{self.id}>"
+
+    async def add_roles(self, *roles, reason=None):
+        await self.http.request()
+        self.roles.extend(role for role in roles if role not in self.roles)
+
+    async def remove_roles(self, *roles, reason=None):
+        await self.http.request()
+        self.roles = [role for role in self.roles if role not in roles]
+
+
+class FakeSource:
+    # Stands in for FFmpegOpusAudio; no process is spawned.
+    def __init__(self, track):
+        self.track = track
+        self.cleaned_up = False
+
+    def cleanup(self):
+        self.cleaned_up = True
+
+
+class FakeVoiceClient:
+    def __init__(self, channel, track_seconds):
+        self.channel = channel
+        self.guild = channel.guild
+        self.track_seconds = track_seconds
+        self.connected = True
+        self.source = None
+        self.plays = []
+        # Seconds between the end of one track and the start of the next, as a listener hears it.
+        self.gaps = []
+        self._after = None
+        self._handle = None
+        self._paused = False
+        self._last_end = None
+
+    def play(self, source, after=None):
+        if self.source is not None:
+            raise RuntimeError("Already playing audio.")
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        if self._last_end is not None:
+            self.gaps.append(now - self._last_end)
+        self.source = source
+        self.plays.append((now, source.track))
+        self._after = after
+        self._handle = loop.call_later(self.track_seconds, self._finish, None)
+
+    def _finish(self, error):
+        self._handle = None
+        source, after = self.source, self._after
+        self.source = self._after = None
+        self._paused = False
+        self._last_end = asyncio.get_running_loop().time()
+        if source is not None:
+            source.cleanup()
+        if after is not None:
+            # The player thread would call this; the cog hands it to the loop with run_coroutine_threadsafe either way.
+            after(error)
+
+    def is_playing(self):
+        return self.source is not None and not self._paused
+
+    def is_paused(self):
+        return self.source is not None and self._paused
+
+    def is_connected(self):
+        return self.connected
+
+    def pause(self):
+        self._paused = True
+
+    def resume(self):
+        self._paused = False
+
+    def stop(self):
+        if self._handle is not None:
+            self._handle.cancel()
+        if self.source is not None:
+            self._finish(None)
+
+    async def disconnect(self, force=False):
+        self.stop()
+        self.connected = False
+        if self.guild.voice_client is self:
+            self.guild.voice_client = None
+
+
+class FakeVoiceChannel:
+    def __init__(self, guild, track_seconds):
+        self.id = next(_ids)
+        self.guild = guild
+        self.track_seconds = track_seconds
+        self.members = []
+
+    @property
+    def voice_states(self):
+        return {member.id: FakeVoiceState(self) for member in self.members}
+
+    async def connect(self, **kwargs):
+        await self.guild.http.request()
+        self.guild.voice_client = FakeVoiceClient(self, self.track_seconds)
+        return self.guild.voice_client
+
+
+class FakeGuild:
+    def __init__(self, http, bot_user=None, role_names=(), track_seconds=180):
+        self.http = http
+        self.id = next(_ids)
+        self.roles = [FakeRole(name) for name in role_names]
+        self.members = {}
+        self.voice_client = None
+        self.text_channel = FakeTextChannel(http)
+        self.voice_channel = FakeVoiceChannel(self, track_seconds)
+        self.me = bot_user
+        if bot_user is not None:
+            self.members[bot_user.id] = bot_user
+            self.voice_channel.members.append(bot_user)
+
+    def add_member(self, in_voice=True):
+        member = FakeMember(self.http, self, voice_channel=self.voice_channel if in_voice else None)
+        self.members[member.id] = member
+        if in_voice:
+            self.voice_channel.members.append(member)
+        return member
+
+    def get_member(self, user_id):
+        return self.members.get(user_id)
+
+    async def fetch_member(self, user_id):
+        await self.http.request()
+        return self.members[user_id]
+
+    def get_role(self, role_id):
+        return next((role for role in self.roles if role.id == role_id), None)
+
+    def get_channel(self, channel_id):
+        return next((channel for channel in (self.text_channel, self.voice_channel) if channel.id == channel_id), None)
+
+
+class FakeUser:
+    def __init__(self):
+        self.id = next(_ids)
+        self.bot = True
+        self.roles = []
+
+    @property
+    def mention(self):
+        return f"<@{self.id}>"
+
+
+class FakeBot:
+    def __init__(self, loop):
+        self.loop = loop
+        self.user = FakeUser()
+        self.guilds = []
+        self.shard_ids = None
+        self.shard_count = None
+        self.closed = False
+
+    def is_closed(self):
+        return self.closed
+
+    def add_guild(self, guild):
+        self.guilds.append(guild)
+        return guild
+
+    def get_guild(self, guild_id):
+        return next((guild for guild in self.guilds if guild.id == guild_id), None)
+
+    @property
+    def voice_clients(self):
+        return [guild.voice_client for guild in self.guilds if guild.voice_client is not None]
+
+
+class FakeContext:
+    # The subset of ApplicationContext the cogs use; every response is one REST round trip.
+    def __init__(self, bot, guild, author):
+        self.bot = bot
+        self.guild = guild
+        self.author = author
+        self.channel = guild.text_channel
+        self.responses = []
+        self.response_times = []
+
+    @property
+    def voice_client(self):
+        return self.guild.voice_client
+
+    async def defer(self, **kwargs):
+        await self.guild.http.request()
+
+    async def respond(self, content=None, embed=None, view=None, **kwargs):
+        await self.guild.http.request()
+        message = FakeMessage(self.guild.http, embed, view, content)
+        self.responses.append(message)
+        self.response_times.append(asyncio.get_running_loop().time())
+        return message
+
+
+def video_id_for(text):
+    return hashlib.sha1(text.encode()).hexdigest()[:11]
+
+
+class FakeYoutubeDL:
+    # Shared by every extraction worker; latency is paid in the worker thread like a real HTTP round trip.
+    def __init__(self, latency=0.3, duration=180, stream_ttl=6 * 3600):
+        self.latency = latency
+        self.duration = duration
+        self.stream_ttl = stream_ttl
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def video_info(self, video_id, title=None):
+        return {
+            'id': video_id,
+            'title': title or f"Video {video_id}",
+            'webpage_url': f"https://www.youtube.com/watch?v={video_id}",
+            'url': f"https://rr1---sn-bench.googlevideo.com/videoplayback?expire={int(time.time()) + self.stream_ttl}"
+                   f"&id={video_id}&itag=251",
+            'acodec': 'opus',
+            'duration': self.duration,
+        }
+
+    def extract_info(self, url, download=False, ie_key=None, process=True):
+        with self._lock:
+            self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        if url.startswith('ytsearch'):
+            query = url.split(':', 1)[1]
+            return {'_type': 'playlist', 'entries': [self.video_info(video_id_for(query), query)]}
+        video_id = parse_qs(urlparse(url).query).get('v', [video_id_for(url)])[0]
+        return self.video_info(video_id)
+
+    def sanitize_info(self, info):
+        return info
+
+
+class FakeSpotify:
+    # Serves one playlist of ``tracks`` tracks, ``page_size`` per simulated Web API page.
+    def __init__(self, tracks=1000, page_size=100, latency=0.15):
+        self.tracks = tracks
+        self.page_size = page_size
+        self.latency = latency
+        self.requests = 0
+
+    async def iter_tracks(self, url):
+        for start in range(0, self.tracks, self.page_size):
+            self.requests += 1
+            if self.latency:
+                await asyncio.sleep(self.latency)
+            for index in range(start, min(start + self.page_size, self.tracks)):
+                yield {'type': 'track', 'id': f"bench{index:06d}", 'name': f"Song {index}",
+                       'artists': [{'name': f"Artist {index % 97}"}]}
+
+    async def close(self):
+        pass
+
+
+class FakeDatabase:
+    # In-process Database: same coroutine API, ``latency`` per query and at most ``pool_size`` in flight.
+    def __init__(self, phrases, latency=0.002, pool_size=10):
+        self.phrases = phrases
+        self.latency = latency
+        self.pool_size = pool_size
+        self.roles = {}
+        self.queries = 0
+        self._pool = None
+
+    async def _query(self):
+        if self._pool is None:
+            self._pool = asyncio.Semaphore(self.pool_size)
+        async with self._pool:
+            self.queries += 1
+            if self.latency:
+                await asyncio.sleep(self.latency)
+
+    async def connect(self):
+        pass
+
+    async def close(self):
+        pass
+
+    async def fetch_pending_roles(self):
+        await self._query()
+        return [{'user_id': user_id, 'role': role, 'guild_id': guild_id, 'expiration': expiration}
+                for (user_id, role), (expiration, guild_id) in self.roles.items()]
+
+    async def fetch_expired_roles(self):
+        return await self.fetch_pending_roles()
+
+    async def delete_role(self, user_id, role_name):
+        await self._query()
+        self.roles.pop((user_id, role_name), None)
+
+    async def delete_roles(self, roles):
+        if not roles:
+            return
+        await self._query()
+        for user_id, role_name, guild_id in roles:
+            if self.roles.get((user_id, role_name), (None, guild_id))[1] == guild_id:
+                self.roles.pop((user_id, role_name), None)
+
+    async def assign_role(self, user_id, role_name, expiration, guild_id=None):
+        await self._query()
+        self.roles[(user_id, role_name)] = (expiration, guild_id)
+
+    async def get_messages_for_range(self, range_key):
+        await self._query()
+        return list(self.phrases.get(range_key, ()))
+
+    async def assign_role_and_get_messages(self, user_id, role_name, expiration, guild_id, range_key):
+        await self._query()
+        self.roles[(user_id, role_name)] = (expiration, guild_id)
+        return list(self.phrases.get(range_key, ()))
+
+    async def get_all_phrases(self):
+        await self._query()
+        return {key: list(messages) for key, messages in self.phrases.items()}
+
+    async def get_phrases_version(self):
+        await self._query()
+        return str(sum(map(len, self.phrases.values())))
+
+    async def install_phrases_trigger(self):
+        await self._query()
+
+    async def listen(self, channel, callback, on_disconnect=None):
+        pass
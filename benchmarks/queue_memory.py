@@ -0,0 +1,82 @@
+"""Compare queue memory for raw yt-dlp info dicts vs. compact Track records.
+
+Run from the repository root: python -m benchmarks.queue_memory [--tracks 1000]
+"""
+import argparse
+import gc
+import tracemalloc
+
+from utils.queue_manager import GuildQueue, Track
+
+
+def synthetic_info(index):
+    # Shaped like a resolved YouTube entry: dozens of formats with per-format headers, thumbnails and captions.
+    video_id = f"vid{index:08d}"
+    http_headers = {
+        'User-Agent': "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0 Safari/537.36",
+        'Accept': "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+        'Accept-Language': "en-us,en;q=0.5",
+        'Sec-Fetch-Mode': "navigate",
+    }
+    formats = [{
+        'format_id': str(format_id),
+        'url': f"https://rr1---sn-example.googlevideo.com/videoplayback?expire=1700000000&id={video_id}&itag={format_id}"
+               f"&source=youtube&requiressl=yes&mime=audio%2Fwebm&gir=yes&clen=3456789&dur=215.321&lmt=1690000000000000",
+        'ext': 'webm' if format_id % 2 else 'm4a',
+        'acodec': 'opus' if format_id % 2 else 'mp4a.40.2',
+        'vcodec': 'none',
+        'abr': 48 + format_id,
+        'asr': 48000,
+        'filesize': 3456789 + format_id,
+        'protocol': 'https',
+        'http_headers': dict(http_headers),
+        'downloader_options': {'http_chunk_size': 10485760},
+    } for format_id in range(30)]
+    return {
+        'id': video_id,
+        'title': f"Synthetic track number {index}",
+        'webpage_url': f"https://www.youtube.com/watch?v={video_id}",
+        'url': formats[-1]['url'],
+        'duration': 215,
+        'formats': formats,
+        'requested_formats': None,
+        'thumbnails': [{'url': f"https://i.ytimg.com/vi/{video_id}/{size}.jpg", 'preference': pref, 'id': str(pref)}
+                       for pref, size in enumerate(('default', 'mqdefault', 'hqdefault', 'sddefault', 'maxresdefault'))],
+        'subtitles': {},
+        'automatic_captions': {lang: [{'ext': 'vtt', 'url': f"https://www.youtube.com/api/timedtext?v={video_id}&lang={lang}"}]
+                               for lang in ('en', 'ru', 'de', 'fr', 'es')},
+        'description': "Synthetic description " * 20,
+        'tags': [f"tag{n}" for n in range(15)],
+        'categories': ['Music'],
+        'http_headers': dict(http_headers),
+    }
+
+
+def measure(build):
+    gc.collect()
+    tracemalloc.start()
+    queue = build()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return queue, current
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--tracks', type=int, default=1000)
+    args = parser.parse_args()
+
+    raw_queue, raw_bytes = measure(lambda: [synthetic_info(i) for i in range(args.tracks)])
+    del raw_queue
+
+    # Each info dict is dropped right after conversion, as in the cog, so only what a Track keeps alive is counted.
+    compact_queue, compact_bytes = measure(lambda: GuildQueue(Track.from_info(synthetic_info(i)) for i in range(args.tracks)))
+
+    print(f"tracks:             {args.tracks}")
+    print(f"raw info dicts:     {raw_bytes / 1024:.1f} KiB ({raw_bytes / args.tracks:.0f} B/track)")
+    print(f"Track + GuildQueue: {compact_bytes / 1024:.1f} KiB ({compact_bytes / args.tracks:.0f} B/track)")
+    print(f"reduction:          {raw_bytes / max(compact_bytes, 1):.1f}x")
+
+
+if __name__ == '__main__':
+    main()
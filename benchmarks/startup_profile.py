@@ -0,0 +1,166 @@
+"""Startup time and resident memory of the gateway cache: Intents.all() vs. the bot's trimmed profile.
+
+Feeds READY and one GUILD_CREATE per synthetic guild straight into py-cord's ConnectionState, shaped
+like what the gateway sends for each intent set: with Intents.all() every member and presence ends up
+in the cache (GUILD_CREATE plus member chunking); with the trimmed profile only the bot itself and
+members in voice channels arrive. Each profile runs in a fresh interpreter so RSS is comparable.
+
+Run from the repository root: python -m benchmarks.startup_profile [--guilds 200 --members 1000]
+"""
+import argparse
+import asyncio
+import gc
+import json
+import subprocess
+import sys
+import time
+
+import discord
+from discord.state import ConnectionState
+
+from utils.startup import bot_intents, member_cache_flags
+
+BOT_ID = 10 ** 17
+CHANNELS_PER_GUILD = 20
+ROLES_PER_GUILD = 15
+VOICE_MEMBERS_PER_GUILD = 3
+
+
+def rss_bytes():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * 4096
+    except OSError:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def user_payload(user_id, bot=False):
+    return {'id': str(user_id), 'username': f"user{user_id}", 'discriminator': "0", 'global_name': f"User {user_id}",
+            'avatar': "a" * 32, 'bot': bot}
+
+
+def member_payload(user_id, guild_roles, bot=False):
+    return {'user': user_payload(user_id, bot), 'roles': [str(role) for role in guild_roles[:2]],
+            'joined_at': "2023-01-01T00:00:00+00:00", 'deaf': False, 'mute': False, 'nick': None, 'flags': 0}
+
+
+def presence_payload(user_id):
+    return {'user': {'id': str(user_id)}, 'status': "online", 'client_status': {'desktop': "online"},
+            'activities': [{'name': "Some Game", 'type': 0, 'created_at': 1700000000000}]}
+
+
+def guild_payload(index, members, full):
+    guild_id = BOT_ID + 1_000_000 * (index + 1)
+    roles = [guild_id + 1 + n for n in range(ROLES_PER_GUILD)]
+    voice_channel = guild_id + 100
+    member_ids = [guild_id + 1000 + n for n in range(members)]
+    voice_ids = member_ids[:VOICE_MEMBERS_PER_GUILD]
+
+    if full:
+        member_list = [member_payload(user_id, roles) for user_id in member_ids]
+        presences = [presence_payload(user_id) for user_id in member_ids]
+    else:
+        # Without the members intent GUILD_CREATE still lists the members sitting in voice channels.
+        member_list = [member_payload(user_id, roles) for user_id in voice_ids]
+        presences = []
+    member_list.append(member_payload(BOT_ID, roles, bot=True))
+
+    return {
+        'id': str(guild_id),
+        'name': f"Guild {index}",
+        'owner_id': str(member_ids[0]),
+        'member_count': members + 1,
+        'large': members >= 250,
+        'unavailable': False,
+        'features': [],
+        'emojis': [],
+        'stickers': [],
+        'roles': [{'id': str(guild_id), 'name': "@everyone", 'permissions': "0", 'position': 0, 'color': 0,
+                   'hoist': False, 'managed': False, 'mentionable': False}]
+                 + [{'id': str(role), 'name': f"role{n}", 'permissions': "0", 'position': n + 1, 'color': 0,
+                     'hoist': False, 'managed': False, 'mentionable': False} for n, role in enumerate(roles)],
+        'channels': [{'id': str(guild_id + 200 + n), 'type': 0, 'name': f"text-{n}", 'position': n,
+                      'permission_overwrites': []} for n in range(CHANNELS_PER_GUILD - 1)]
+                    + [{'id': str(voice_channel), 'type': 2, 'name': "voice", 'position': CHANNELS_PER_GUILD,
+                        'permission_overwrites': [], 'bitrate': 64000, 'user_limit': 0}],
+        'threads': [],
+        'members': member_list,
+        'presences': presences,
+        # Voice states always carry the member, whatever the intents.
+        'voice_states': [{'user_id': str(user_id), 'channel_id': str(voice_channel), 'session_id': "x",
+                          'deaf': False, 'mute': False, 'self_deaf': False, 'self_mute': False,
+                          'self_video': False, 'suppress': False, 'member': member_payload(user_id, roles)}
+                         for user_id in voice_ids],
+    }
+
+
+def profile_options(name):
+    if name == 'all':
+        intents = discord.Intents.all()
+        return dict(intents=intents, member_cache_flags=discord.MemberCacheFlags.from_intents(intents),
+                    chunk_guilds_at_startup=False), True
+    return dict(intents=bot_intents(), member_cache_flags=member_cache_flags(), chunk_guilds_at_startup=False), False
+
+
+async def load_guilds(name, guilds, members):
+    options, full = profile_options(name)
+    state = ConnectionState(dispatch=lambda *args, **kwargs: None, handlers={}, hooks={}, http=None,
+                            loop=asyncio.get_running_loop(), **options)
+    gc.collect()
+    rss_before = rss_bytes()
+    parse_seconds = 0.0
+
+    state.parse_ready({'v': 10, 'user': user_payload(BOT_ID, bot=True), 'guilds': [], 'session_id': "bench",
+                       'application': {'id': str(BOT_ID), 'flags': 0}})
+    if state._ready_task is not None:
+        state._ready_task.cancel()
+
+    for index in range(guilds):
+        # Payloads are built outside the timer and dropped after parsing, like a decoded gateway frame.
+        data = guild_payload(index, members, full)
+        start = time.perf_counter()
+        state.parse_guild_create(data)
+        parse_seconds += time.perf_counter() - start
+        del data
+
+    gc.collect()
+    return {
+        'profile': name,
+        'guilds': len(state._guilds),
+        'cached_members': sum(len(guild._members) for guild in state._guilds.values()),
+        'cached_users': len(state._users),
+        'parse_s': round(parse_seconds, 3),
+        'rss_delta_mib': round((rss_bytes() - rss_before) / 1024 ** 2, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--guilds', type=int, default=200)
+    parser.add_argument('--members', type=int, default=1000, help="members per guild")
+    parser.add_argument('--profile', choices=('all', 'trimmed'), help=argparse.SUPPRESS)
+    parser.add_argument('--output', help="write JSON results here instead of stdout")
+    args = parser.parse_args()
+
+    if args.profile:
+        print(json.dumps(asyncio.run(load_guilds(args.profile, args.guilds, args.members))))
+        return
+
+    results = []
+    for profile in ('all', 'trimmed'):
+        child = subprocess.run([sys.executable, '-m', 'benchmarks.startup_profile', '--profile', profile,
+                                '--guilds', str(args.guilds), '--members', str(args.members)],
+                               capture_output=True, text=True, check=True)
+        results.append(json.loads(child.stdout.strip().splitlines()[-1]))
+
+    output = json.dumps({'guilds': args.guilds, 'members_per_guild': args.members, 'results': results}, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
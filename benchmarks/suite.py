@@ -0,0 +1,388 @@
+"""Offline end-to-end benchmarks for the Music and TYD cogs.
+
+Drives the cog methods directly against the stand-ins in benchmarks.fakes (Discord, yt-dlp,
+Spotify, PostgreSQL), so no tokens, network or database are needed. Results are written as JSON
+so two runs can be diffed:
+
+    python -m benchmarks.suite --output before.json
+    python -m benchmarks.suite --scenario tyd --rest-latency 0.1 --output after.json
+"""
+import argparse
+import asyncio
+import functools
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+# Read at import time or when the cogs are built; keep the benchmark's caches out of the working tree.
+SCRATCH_DIR = tempfile.mkdtemp(prefix="bot-bench-")
+os.environ['MUSIC_CACHE_PATH'] = os.path.join(SCRATCH_DIR, 'music.db')
+os.environ['AUDIO_CACHE_DIR'] = os.path.join(SCRATCH_DIR, 'audio')
+os.environ['EXTRACTION_MODE'] = 'thread'
+os.environ['QUEUE_STATE_PATH'] = os.path.join(SCRATCH_DIR, 'queues.db')
+
+import cogs.music
+import utils.extraction
+from cogs.music import Music
+from cogs.tyd import TYD
+from utils.cache import ResolutionCache
+from utils.phrases import PhraseCache
+from utils.queue_manager import Track
+from utils.role_expiry import RoleExpiryScheduler
+
+from benchmarks.fakes import (FakeBot, FakeContext, FakeDatabase, FakeGuild, FakeHTTP, FakeSource, FakeSpotify,
+                              FakeYoutubeDL)
+
+TYD_ROLES = ("Имеет немного власти", "Одинокая половинка", "Грешник", "Неудачник", "Участник под номером 100",
+             "Эскапист", "Любимец фортуны", "Средний класс")
+TYD_RANGES = ("0", "1", "2-10", "11-29", "50", "66", "77", "100", "101", "default")
+
+
+def summarize(samples):
+    if not samples:
+        return {'count': 0}
+    ordered = sorted(samples)
+
+    def percentile(p):
+        return ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))]
+
+    return {
+        'count': len(ordered),
+        'mean_ms': round(sum(ordered) / len(ordered) * 1000, 3),
+        'p50_ms': round(percentile(50) * 1000, 3),
+        'p95_ms': round(percentile(95) * 1000, 3),
+        'p99_ms': round(percentile(99) * 1000, 3),
+        'max_ms': round(ordered[-1] * 1000, 3),
+    }
+
+
+class BenchMusic(Music):
+    def create_source(self, track, start_at=None):
+        # FFmpeg start-up is not simulated; gaps measure resolution and scheduling only.
+        return FakeSource(track)
+
+
+def build_music(bot, ytdl, spotify, cache_name):
+    utils.extraction.create_ytdl = lambda profile='full': ytdl
+    cogs.music.spotify = spotify
+    cogs.music.ResolutionCache = functools.partial(ResolutionCache, path=os.path.join(SCRATCH_DIR, f"{cache_name}.db"))
+    cog = BenchMusic(bot)
+    # Every track is played once or twice; never start real audio cache downloads.
+    cog.audio_cache.min_plays = float('inf')
+    return cog
+
+
+async def unload_music(cog):
+    for guild_id in list(cog.guild_states):
+        cog.release_guild(guild_id)
+    cog.cog_unload()
+    await asyncio.sleep(0)
+
+
+async def finish_imports(cog, guild_id):
+    state = cog.guild_states.get(guild_id)
+    if state:
+        await asyncio.gather(*list(state.get('import_tasks', ())), return_exceptions=True)
+
+
+async def bench_spotify_play(args):
+    loop = asyncio.get_running_loop()
+    bot = FakeBot(loop)
+    ytdl = FakeYoutubeDL(latency=args.ytdl_latency)
+    spotify = FakeSpotify(tracks=args.spotify_tracks, latency=args.spotify_latency)
+    cog = build_music(bot, ytdl, spotify, "spotify_play")
+    results = {}
+    try:
+        # The second pass hits the resolution cache filled by the first.
+        for run in ("cold", "warm"):
+            http = FakeHTTP(args.rest_latency)
+            guild = bot.add_guild(FakeGuild(http, bot.user, track_seconds=3600))
+            ctx = FakeContext(bot, guild, guild.add_member())
+            calls_before = ytdl.calls
+
+            started = loop.time()
+            await cog.play.callback(cog, ctx, url="https://open.spotify.com/playlist/bench")
+            returned = loop.time()
+            await finish_imports(cog, guild.id)
+            finished = loop.time()
+
+            state = cog.guild_states.get(guild.id, {})
+            voice_client = guild.voice_client
+            results[run] = {
+                'first_response_s': round(ctx.response_times[0] - started, 4) if ctx.response_times else None,
+                'first_play_s': round(voice_client.plays[0][0] - started, 4) if voice_client and voice_client.plays else None,
+                'command_s': round(returned - started, 4),
+                'import_s': round(finished - started, 4),
+                'tracks_queued': len(state.get('queue', ())) + (1 if voice_client and voice_client.plays else 0),
+                'extractions': ytdl.calls - calls_before,
+                'rest_calls': http.calls,
+            }
+            cog.release_guild(guild.id)
+            if voice_client:
+                await voice_client.disconnect()
+    finally:
+        await unload_music(cog)
+    return {'tracks': args.spotify_tracks, **results}
+
+
+async def bench_queue_render(args):
+    loop = asyncio.get_running_loop()
+    bot = FakeBot(loop)
+    cog = build_music(bot, FakeYoutubeDL(latency=0), FakeSpotify(), "queue_render")
+    try:
+        # No REST latency: this measures building the response, not sending it.
+        guild = bot.add_guild(FakeGuild(FakeHTTP(0), bot.user))
+        ctx = FakeContext(bot, guild, guild.add_member())
+        state = cog.get_guild_state(ctx)
+        state['queue'].extend(
+            Track(f"vid{index:08d}", f"Synthetic track number {index}", f"https://www.youtube.com/watch?v=vid{index:08d}",
+                  duration=215, requester=ctx.author.id)
+            for index in range(args.queue_tracks))
+        state['current_playing'] = "Synthetic current track - https://www.youtube.com/watch?v=current"
+
+        timings = []
+        peak = 0
+        for _ in range(args.repeat):
+            tracemalloc.start()
+            start = time.perf_counter()
+            await cog.show_queue.callback(cog, ctx)
+            timings.append(time.perf_counter() - start)
+            peak = max(peak, tracemalloc.get_traced_memory()[1])
+            tracemalloc.stop()
+            for message in ctx.responses:
+                if message.view is not None:
+                    message.view.stop()
+            ctx.responses.clear()
+
+        # A button press on the last page: the deepest slice of the live queue.
+        last_page = (args.queue_tracks - 1) // cogs.music.QUEUE_PAGE_SIZE
+        page_timings = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            cog.create_queue_embed(state, last_page)
+            page_timings.append(time.perf_counter() - start)
+    finally:
+        await unload_music(cog)
+    return {'tracks': args.queue_tracks, 'latency': summarize(timings), 'peak_alloc_kib': round(peak / 1024, 1),
+            'last_page_render': summarize(page_timings)}
+
+
+async def bench_tyd(args):
+    loop = asyncio.get_running_loop()
+    random.seed(args.seed)
+    bot = FakeBot(loop)
+    http = FakeHTTP(args.rest_latency)
+    phrases = {key: [f"{{user_mention}} выбросил {{random_number}} ({key}, фраза {n}) — {{bot_mention}}"
+                     for n in range(20)] for key in TYD_RANGES}
+    db = FakeDatabase(phrases, latency=args.db_latency, pool_size=args.db_pool_size)
+
+    cog = TYD(bot)
+    cog.db = db
+    cog.phrases = PhraseCache(db)
+    cog.role_expiry = RoleExpiryScheduler(db, cog.remove_expired_role)
+    await cog.phrases.load()
+    await cog.role_expiry.start()
+
+    contexts = []
+    for _ in range(args.guilds):
+        guild = bot.add_guild(FakeGuild(http, bot.user, role_names=TYD_ROLES))
+        contexts.extend(FakeContext(bot, guild, guild.add_member(in_voice=False)) for _ in range(args.members))
+
+    async def invoke(ctx):
+        start = loop.time()
+        await cog.tyd.callback(cog, ctx)
+        return ctx.response_times[0] - start, loop.time() - start
+
+    try:
+        started = loop.time()
+        latencies = await asyncio.gather(*(invoke(ctx) for ctx in contexts))
+        elapsed = loop.time() - started
+    finally:
+        cog.cog_unload()
+
+    return {
+        'guilds': args.guilds,
+        'invocations': len(contexts),
+        'wall_s': round(elapsed, 4),
+        'throughput_per_s': round(len(contexts) / elapsed, 1) if elapsed else None,
+        'reply_latency': summarize([reply for reply, _ in latencies]),
+        'latency': summarize([total for _, total in latencies]),
+        'db_queries': db.queries,
+        'rest_calls': http.calls,
+        'roles_scheduled': len(cog.role_expiry),
+    }
+
+
+async def play_through(cog, bot, ytdl, tracks, track_seconds, rest_latency):
+    guild = bot.add_guild(FakeGuild(FakeHTTP(rest_latency), bot.user, track_seconds=track_seconds))
+    ctx = FakeContext(bot, guild, guild.add_member())
+    state = cog.get_guild_state(ctx)
+    # Flat entries without a stream URL, as queued from a YouTube playlist: every track needs resolving.
+    state['queue'].extend(Track(f"gap{index:05d}", f"Track {index}", f"https://www.youtube.com/watch?v=gap{index:05d}",
+                                duration=track_seconds, requester=ctx.author.id) for index in range(tracks))
+    await ctx.author.voice.channel.connect()
+    voice_client = guild.voice_client
+    await cog.play_next_track(ctx)
+
+    deadline = asyncio.get_running_loop().time() + tracks * (track_seconds + ytdl.latency + 1) + 10
+    while len(voice_client.plays) < tracks or voice_client.is_playing():
+        if asyncio.get_running_loop().time() > deadline:
+            break
+        await asyncio.sleep(0.01)
+    cog.release_guild(guild.id)
+    await voice_client.disconnect()
+    return voice_client
+
+
+async def bench_track_gap(args):
+    loop = asyncio.get_running_loop()
+    results = {}
+    for mode, depth in (("prefetch", None), ("no_prefetch", 0)):
+        bot = FakeBot(loop)
+        ytdl = FakeYoutubeDL(latency=args.ytdl_latency, duration=args.track_seconds)
+        cog = build_music(bot, ytdl, FakeSpotify(), f"track_gap_{mode}")
+        if depth is not None:
+            cog.prefetcher.depth = depth
+        try:
+            voice_client = await play_through(cog, bot, ytdl, args.gap_tracks, args.track_seconds, args.rest_latency)
+        finally:
+            await unload_music(cog)
+        results[mode] = {'tracks_played': len(voice_client.plays), 'gap': summarize(voice_client.gaps),
+                         'extractions': ytdl.calls}
+    return {'tracks': args.gap_tracks, 'track_seconds': args.track_seconds, **results}
+
+
+async def bench_warm_restart(args):
+    loop = asyncio.get_running_loop()
+    bot = FakeBot(loop)
+    ytdl = FakeYoutubeDL(latency=args.ytdl_latency, duration=3600)
+    cog = build_music(bot, ytdl, FakeSpotify(), "warm_restart")
+    guilds = []
+    for index in range(args.restore_guilds):
+        guild = bot.add_guild(FakeGuild(FakeHTTP(args.rest_latency), bot.user, track_seconds=3600))
+        ctx = FakeContext(bot, guild, guild.add_member())
+        state = cog.get_guild_state(ctx)
+        state['queue'].extend(Track(f"r{index:03d}t{n:05d}", f"Track {n}", f"https://www.youtube.com/watch?v=r{index:03d}t{n:05d}",
+                                    duration=3600, requester=ctx.author.id) for n in range(args.restore_tracks))
+        await ctx.author.voice.channel.connect()
+        await cog.play_next_track(ctx)
+        guilds.append(guild)
+
+    # Everything marked dirty above goes out as one batch.
+    dirty = len(cog.queue_store._dirty)
+    started = time.perf_counter()
+    await cog.queue_store.flush()
+    flush_s = time.perf_counter() - started
+
+    # Crash: nothing more is written, and the voice connections drop with the process.
+    bot.closed = True
+    for guild in guilds:
+        cog.release_guild(guild.id)
+        await guild.voice_client.disconnect()
+    await unload_music(cog)
+    bot.closed = False
+
+    cog = build_music(bot, ytdl, FakeSpotify(), "warm_restart")
+    calls_before = ytdl.calls
+    started = loop.time()
+    try:
+        await cog.restore_queues()
+        restored = loop.time() - started
+        first_plays = [guild.voice_client.plays[0][0] - started for guild in guilds
+                       if guild.voice_client and guild.voice_client.plays]
+        tracks = sum(len(cog.guild_states[guild.id]['queue']) + 1 for guild in guilds if guild.id in cog.guild_states)
+    finally:
+        await unload_music(cog)
+    return {
+        'guilds': args.restore_guilds,
+        'tracks_per_guild': args.restore_tracks,
+        'snapshot_batch': {'guilds': dirty, 'write_s': round(flush_s, 4)},
+        'restore_s': round(restored, 4),
+        'first_play': summarize(first_plays),
+        'tracks_restored': tracks,
+        # Stream URLs only (the interrupted track and the prefetched ones after it); no metadata is re-extracted.
+        'extractions': ytdl.calls - calls_before,
+    }
+
+
+SCENARIOS = {
+    'spotify_play': bench_spotify_play,
+    'queue_render': bench_queue_render,
+    'tyd': bench_tyd,
+    'track_gap': bench_track_gap,
+    'warm_restart': bench_warm_restart,
+}
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def run(args):
+    results = {}
+    for name in args.scenario or SCENARIOS:
+        print(f"running {name}...", file=sys.stderr)
+        results[name] = await SCENARIOS[name](args)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scenario', action='append', choices=sorted(SCENARIOS),
+                        help="run only this scenario (repeatable); default: all")
+    parser.add_argument('--output', help="write JSON results here instead of stdout")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--rest-latency', type=float, default=0.05, help="Discord REST round trip, seconds")
+    parser.add_argument('--ytdl-latency', type=float, default=0.05, help="yt-dlp extraction time, seconds")
+    parser.add_argument('--spotify-latency', type=float, default=0.15, help="Spotify Web API page fetch, seconds")
+    parser.add_argument('--db-latency', type=float, default=0.002, help="PostgreSQL query round trip, seconds")
+    parser.add_argument('--db-pool-size', type=int, default=10)
+    parser.add_argument('--spotify-tracks', type=int, default=1000)
+    parser.add_argument('--queue-tracks', type=int, default=5000)
+    parser.add_argument('--repeat', type=int, default=20, help="/queue renders to time")
+    parser.add_argument('--guilds', type=int, default=100)
+    parser.add_argument('--members', type=int, default=5, help="/tyd callers per guild")
+    parser.add_argument('--gap-tracks', type=int, default=10)
+    parser.add_argument('--track-seconds', type=float, default=0.5, help="simulated track length")
+    parser.add_argument('--restore-guilds', type=int, default=20, help="guilds with a saved queue")
+    parser.add_argument('--restore-tracks', type=int, default=500, help="tracks per saved queue")
+    args = parser.parse_args()
+
+    try:
+        scenarios = asyncio.run(run(args))
+    finally:
+        shutil.rmtree(SCRATCH_DIR, ignore_errors=True)
+
+    report = {
+        'meta': {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'revision': git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'parameters': {key: value for key, value in vars(args).items() if key not in ('output', 'scenario')},
+        },
+        'scenarios': scenarios,
+    }
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output + "\n")
+        print(f"results written to {args.output}", file=sys.stderr)
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
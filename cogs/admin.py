@@ -0,0 +1,55 @@
+import asyncio
+import io
+import logging
+from datetime import datetime
+
+import discord
+from discord import Option
+from discord.ext import commands
+
+from utils.profiling import STALL_THRESHOLD, ProfileSession
+
+log = logging.getLogger(__name__)
+
+
+class Admin(commands.Cog):
+    def __init__(self, bot):
+        self.bot = bot
+        # Profiling is process-wide, so only one window runs at a time.
+        self.profiling = asyncio.Lock()
+
+    @commands.slash_command(name="profile", description="Профилировать бота и прислать отчёт")
+    @discord.default_permissions(administrator=True)
+    async def profile(self, ctx,
+                      seconds: Option(int, "Длительность в секундах", min_value=5, max_value=300, default=30),
+                      report: Option(str, "Формат отчёта", choices=["collapsed", "pstats"], default="collapsed"),
+                      stall_ms: Option(int, "Порог задержки цикла событий, мс", min_value=10, max_value=5000,
+                                       default=int(STALL_THRESHOLD * 1000))):
+        # Stack traces and timings cover every guild, so server administrators alone are not enough.
+        if not await self.bot.is_owner(ctx.author):
+            await ctx.respond("Эта команда доступна только владельцу бота.", ephemeral=True)
+            return
+        if self.profiling.locked():
+            await ctx.respond("Профилирование уже идёт, дождитесь отчёта.", ephemeral=True)
+            return
+
+        async with self.profiling:
+            await ctx.defer(ephemeral=True)
+            session = ProfileSession(self.bot.loop, report, stall_ms / 1000)
+            log.info("Profiling for %ds (%s, stalls over %d ms) requested by %s", seconds, report, stall_ms, ctx.author.id)
+            await session.run(seconds)
+
+        stalls = session.monitor.stalls
+        embed = discord.Embed(title="📊 Профиль", color=discord.Color.blue(),
+                              description=f"**{seconds} с**, формат `{report}`, задержек цикла событий "
+                                          f"дольше {stall_ms} мс: **{len(stalls)}**")
+        embed.add_field(name="Самое затратное", value="\n".join(session.profiler.top()) or "—", inline=False)
+        if stalls:
+            embed.add_field(name="Худшие задержки", value="\n".join(session.monitor.worst()), inline=False)
+        filename = f"profile-{datetime.now():%Y%m%d-%H%M%S}.{session.extension}"
+        await ctx.respond(embed=embed, file=discord.File(io.BytesIO(session.report()), filename=filename),
+                          ephemeral=True)
+
+
+def setup(bot):
+    bot.add_cog(Admin(bot))
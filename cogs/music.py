@@ -1,11 +1,146 @@
 import asyncio
-from typing import Union, List
+import logging
+import os
+import re
+from typing import Optional
 
+import aiohttp
 import discord
 from discord import Option
 from discord.ext import commands, tasks
 
-from utils.music_utils import ytdl, sp
+from utils.audio_cache import AudioCache
+from utils.cache import ResolutionCache
+from utils.extraction import ExtractionCancelled, ExtractionEngine
+from utils.idle import IdleManager
+from utils import metrics
+from utils.music_utils import spotify
+from utils.prefetch import StreamPrefetcher, is_stream_fresh
+from utils.queue_manager import GuildQueue, Track
+from utils.queue_store import QueueStore
+from utils.spotify import SpotifyError, parse_spotify_url
+from utils.startup import owns_guild
+
+log = logging.getLogger(__name__)
+
+SPOTIFY_RESOLVE_CONCURRENCY = int(os.getenv("SPOTIFY_RESOLVE_CONCURRENCY", 4))
+SPOTIFY_PROGRESS_INTERVAL = 2
+IDLE_TIMEOUT = int(os.getenv("IDLE_TIMEOUT", 300))
+PREFETCH_DEPTH = int(os.getenv("PREFETCH_DEPTH", 2))
+PREFETCH_SPAWN_LEAD = int(os.getenv("PREFETCH_SPAWN_LEAD", 15))
+PLAYLIST_PAGE_SIZE = int(os.getenv("PLAYLIST_PAGE_SIZE", 100))
+PLAYLIST_MAX_TRACKS = int(os.getenv("PLAYLIST_MAX_TRACKS", 5000))
+QUEUE_PAGE_SIZE = 10
+QUEUE_VIEW_TIMEOUT = int(os.getenv("QUEUE_VIEW_TIMEOUT", 180))
+# A restored track resumes where it stopped unless that is this close to either end.
+RESUME_MARGIN = 5
+YOUTUBE_PLAYLIST_RE = re.compile(r"(youtube\.com|youtu\.be)/.*[?&]list=|youtube\.com/playlist")
+
+
+class SpotifyImport:
+    def __init__(self, url):
+        self.url = url
+        self.total = 0
+        self.added = []
+        self.failed = 0
+        self.done = False
+        self.message = None
+        self.first_ready = asyncio.Event()
+
+
+class RestoredContext:
+    # Stands in for the ApplicationContext of the /play that built a restored queue: the playback
+    # path only needs the guild, its voice client and somewhere to post, which is the saved text channel.
+    def __init__(self, guild, channel):
+        self.guild = guild
+        self.channel = channel
+        self.author = guild.me
+
+    @property
+    def voice_client(self):
+        return self.guild.voice_client
+
+    async def respond(self, *args, **kwargs):
+        return await self.channel.send(*args, **kwargs)
+
+
+class QueuePageModal(discord.ui.Modal):
+    def __init__(self, paginator):
+        super().__init__(title="Перейти к странице")
+        self.paginator = paginator
+        self.add_item(discord.ui.InputText(label=f"Номер страницы (1–{paginator.page_count()})",
+                                           placeholder="1", max_length=6))
+
+    async def callback(self, interaction):
+        value = self.children[0].value.strip()
+        if not value.isdigit():
+            await interaction.response.send_message("Введите номер страницы числом.", ephemeral=True)
+            return
+        await self.paginator.show_page(interaction, int(value) - 1)
+
+
+class QueuePaginator(discord.ui.View):
+    # Holds no embeds: each press renders one page from the guild's current queue, and the view
+    # (with its callbacks) is dropped once it times out.
+    def __init__(self, cog, guild_id, author_id):
+        super().__init__(timeout=QUEUE_VIEW_TIMEOUT)
+        self.cog = cog
+        self.guild_id = guild_id
+        self.author_id = author_id
+        self.page = 0
+        self.update_buttons()
+
+    def page_count(self):
+        state = self.cog.guild_states.get(self.guild_id)
+        return max(1, -(-len(state['queue']) // QUEUE_PAGE_SIZE)) if state else 1
+
+    def update_buttons(self):
+        self.jump.label = f"{self.page + 1}/{self.page_count()}"
+
+    async def show_page(self, interaction, page):
+        state = self.cog.guild_states.get(self.guild_id)
+        if not state or not state['queue']:
+            self.stop()
+            embed = self.cog.create_embed("Очередь пуста", "Добавьте треки с помощью команды **/play**!")
+            await interaction.response.edit_message(embed=embed, view=None)
+            return
+        self.page = min(max(page, 0), self.page_count() - 1)
+        self.update_buttons()
+        await interaction.response.edit_message(embed=self.cog.create_queue_embed(state, self.page), view=self)
+
+    async def interaction_check(self, interaction):
+        if interaction.user.id != self.author_id:
+            await interaction.response.send_message("Вы не можете управлять этой страницей.", ephemeral=True)
+            return False
+        return True
+
+    async def on_timeout(self):
+        self.disable_all_items()
+        if self.message is not None:
+            try:
+                await self.message.edit(view=self)
+            except discord.HTTPException:
+                pass
+
+    @discord.ui.button(emoji="⏮️", style=discord.ButtonStyle.secondary)
+    async def first_page(self, button, interaction):
+        await self.show_page(interaction, 0)
+
+    @discord.ui.button(emoji="⬅️", style=discord.ButtonStyle.primary)
+    async def previous_page(self, button, interaction):
+        await self.show_page(interaction, (self.page - 1) % self.page_count())
+
+    @discord.ui.button(label="1/1", style=discord.ButtonStyle.secondary)
+    async def jump(self, button, interaction):
+        await interaction.response.send_modal(QueuePageModal(self))
+
+    @discord.ui.button(emoji="➡️", style=discord.ButtonStyle.primary)
+    async def next_page(self, button, interaction):
+        await self.show_page(interaction, (self.page + 1) % self.page_count())
+
+    @discord.ui.button(emoji="⏭️", style=discord.ButtonStyle.secondary)
+    async def last_page(self, button, interaction):
+        await self.show_page(interaction, self.page_count() - 1)
 
 
 class Music(commands.Cog):
@@ -13,66 +148,294 @@ class Music(commands.Cog):
         self.bot = bot
         self.loop = bot.loop
         self.guild_states = {}
-        self.disconnect_timer.start()
+        self.extractor = ExtractionEngine()
+        # One per cog: cog_unload closes it, and a reloaded cog opens a fresh one.
+        self.resolution_cache = ResolutionCache()
+        self.audio_cache = AudioCache(self.resolution_cache.record_play)
+        self.prefetcher = StreamPrefetcher(self.resolve_stream, self.create_source,
+                                           depth=PREFETCH_DEPTH, spawn_lead=PREFETCH_SPAWN_LEAD)
+        self.idle = IdleManager(self.on_idle, IDLE_TIMEOUT)
+        self.queue_store = QueueStore(self.snapshot_guild, paused=self.bot.is_closed)
+        # guild_id -> restore task, for guilds whose saved queue hasn't been brought back yet.
+        self.pending_restores = {}
+        # Guilds whose voice client /play is moving to another channel; their leave event isn't a release.
+        self.moving = set()
+        self.warmed_up = False
+        self.cache_maintenance.start()
+        self.save_positions.start()
+        self.register_metrics()
 
     def cog_unload(self):
-        self.disconnect_timer.cancel()
-
-    @tasks.loop(minutes=5)
-    async def disconnect_timer(self):
-        for guild_id, state in list(self.guild_states.items()):
-            voice_client = state.get('voice_client')
-            last_played = state.get('last_played')
-            if voice_client and not voice_client.is_playing() and last_played and (
-                    discord.utils.utcnow() - last_played).total_seconds() >= 300:
-                await self.leave_voice_channel(voice_client, guild_id)
-
-    async def leave_voice_channel(self, voice_client, guild_id):
+        self.idle.clear()
+        self.cache_maintenance.cancel()
+        self.save_positions.cancel()
+        self.queue_store.close()
+        self.loop.create_task(spotify.close())
+        self.resolution_cache.close()
+        self.extractor.shutdown()
+        self.audio_cache.close()
+
+    def register_metrics(self):
+        metrics.QUEUE_LENGTH.set_function(
+            lambda: [((guild_id,), len(state['queue'])) for guild_id, state in self.guild_states.items()])
+        metrics.VOICE_CLIENTS.set_function(lambda: len(self.bot.voice_clients))
+        metrics.FFMPEG_PROCESSES.set_function(
+            lambda: sum(1 for vc in self.bot.voice_clients if vc.is_playing() or vc.is_paused())
+            + self.prefetcher.source_count())
+        metrics.CACHE_LOOKUPS.set_function(lambda: [((result,), count) for result, count in self.resolution_cache.stats.items()])
+        metrics.CACHE_HIT_RATIO.set_function(self.resolution_cache.hit_rate)
+        metrics.AUDIO_CACHE_BYTES.set_function(lambda: self.audio_cache.total_bytes)
+
+    @commands.Cog.listener()
+    async def on_ready(self):
+        if self.warmed_up:
+            return
+        self.warmed_up = True
+        # Everything here would otherwise happen inside the first /play; none of it depends on the rest.
+        startup = self.bot.startup
+        results = await asyncio.gather(
+            startup.timed("ytdl_workers", self.extractor.warm()),
+            startup.timed("spotify_token", spotify.warm()),
+            startup.timed("resolution_cache", self.resolution_cache.open()),
+            startup.timed("audio_cache", self.audio_cache.load()),
+            return_exceptions=True,
+        )
+        for result in results:
+            if isinstance(result, Exception):
+                log.warning("Music warm-up step failed: %s", result)
+        await self.restore_queues()
+
+    @tasks.loop(hours=6)
+    async def cache_maintenance(self):
+        await self.resolution_cache.purge_expired()
+
+    @tasks.loop(seconds=30)
+    async def save_positions(self):
+        positions = {guild_id: self.playback_position(state)
+                     for guild_id, state in self.guild_states.items()
+                     if state.get('current_playing') and guild_id not in self.pending_restores}
+        try:
+            await self.queue_store.save_positions(positions)
+        except Exception as e:
+            log.warning("Failed to save playback positions: %s", e)
+
+    def save_queue(self, guild_id):
+        # Write-behind: the snapshot is taken when the store flushes, so a burst of changes is one write.
+        if guild_id not in self.pending_restores:
+            self.queue_store.mark_dirty(guild_id)
+
+    def playback_position(self, state):
+        # The clock stops while paused; /resume shifts track_started by the time spent paused.
+        return state.get('paused_at', self.loop.time()) - state['track_started']
+
+    def snapshot_guild(self, guild_id):
+        state = self.guild_states.get(guild_id)
+        if not state:
+            return None
+        guild = self.bot.get_guild(guild_id)
+        voice_client = guild.voice_client if guild else None
+        voice_channel = voice_client.channel if voice_client else state.get('voice_channel')
+        text_channel = state.get('text_channel')
+        current = state.get('current_track') if state.get('current_playing') else None
+        if voice_channel is None or text_channel is None or not (current or state['queue']):
+            return None
+        return {
+            'text_channel_id': text_channel.id,
+            'voice_channel_id': voice_channel.id,
+            'current': current.to_record() if current else None,
+            'position': self.playback_position(state) if current else 0,
+            'tracks': [track.to_record() for track in state['queue']],
+        }
+
+    async def restore_queues(self):
+        try:
+            guild_ids = await self.queue_store.saved_guilds()
+        except Exception as e:
+            log.warning("Failed to read saved queues: %s", e)
+            return
+        # Another cluster's guilds are left for that cluster.
+        guild_ids = [guild_id for guild_id in guild_ids
+                     if owns_guild(self.bot, guild_id) and guild_id not in self.guild_states]
+        for guild_id in guild_ids:
+            self.pending_restores[guild_id] = None
+        # One guild at a time, so a large fleet of saved queues doesn't reconnect to voice all at once;
+        # a command in a guild that hasn't had its turn yet restores it first (see restore_guild).
+        for guild_id in guild_ids:
+            await self.restore_guild(guild_id)
+
+    async def restore_guild(self, guild_id):
+        if guild_id not in self.pending_restores:
+            return
+        task = self.pending_restores[guild_id]
+        if task is None:
+            task = self.pending_restores[guild_id] = self.loop.create_task(self.load_saved_queue(guild_id))
+        try:
+            await asyncio.shield(task)
+        except Exception as e:
+            log.warning("Failed to restore the queue of guild %s: %s", guild_id, e)
+        finally:
+            self.pending_restores.pop(guild_id, None)
+
+    def discard_restore(self, guild_id):
+        # Only a restore that hasn't started yet can be dropped; a running one finishes first.
+        if guild_id in self.pending_restores and self.pending_restores[guild_id] is None:
+            del self.pending_restores[guild_id]
+            self.save_queue(guild_id)
+
+    async def load_saved_queue(self, guild_id):
+        saved = await self.queue_store.load(guild_id)
+        guild = self.bot.get_guild(guild_id)
+        text_channel = guild.get_channel(saved['text_channel_id']) if guild and saved else None
+        voice_channel = guild.get_channel(saved['voice_channel_id']) if guild and saved else None
+        if text_channel is None or voice_channel is None or guild_id in self.guild_states:
+            # Nothing to restore into; the saved row goes with the next flush.
+            self.pending_restores.pop(guild_id, None)
+            self.save_queue(guild_id)
+            return
+
+        # The saved records carry everything the queue shows; streams are resolved as tracks come up.
+        tracks = [Track.from_record(record) for record in saved['tracks']]
+        resume_at = None
+        if saved['current']:
+            current = Track.from_record(saved['current'])
+            tracks.insert(0, current)
+            if current.id and RESUME_MARGIN <= saved['position'] <= (current.duration or 0) - RESUME_MARGIN:
+                resume_at = (current.id, saved['position'])
+        self.guild_states[guild_id] = {
+            'queue': GuildQueue(tracks, on_change=lambda: self.save_queue(guild_id)),
+            'last_played': None,
+            'voice_client': None,
+            'text_channel': text_channel,
+            'voice_channel': voice_channel,
+            'resume_at': resume_at,
+        }
+        self.pending_restores.pop(guild_id, None)
+        # Until something plays, the queue waits for the next /play. If nobody comes back before the idle
+        # timer, it is dropped along with its snapshot rather than restored again on every restart.
+        self.idle.arm(guild_id)
+
+        if not self.has_listeners(voice_channel):
+            return
+        ctx = RestoredContext(guild, text_channel)
+        await voice_channel.connect()
+        embed = self.create_embed("🔄 Очередь восстановлена",
+                                  f"Бот был перезапущен. В очереди {len(tracks)} треков, продолжаю воспроизведение.")
+        await text_channel.send(embed=embed)
+        await self.play_next_track(ctx)
+
+    async def on_idle(self, guild_id, reason):
+        guild = self.bot.get_guild(guild_id)
+        voice_client = guild.voice_client if guild else None
+        if reason == "idle" and voice_client and voice_client.is_playing():
+            return
+        await self.leave_voice_channel(voice_client, guild_id, reason)
+
+    @commands.Cog.listener()
+    async def on_voice_state_update(self, member, before, after):
+        guild_id = member.guild.id
+        if member.id == self.bot.user.id:
+            if after.channel is None and guild_id in self.guild_states and guild_id not in self.moving:
+                # Kicked or disconnected from outside /stop.
+                self.release_guild(guild_id)
+            return
+
+        voice_client = member.guild.voice_client
+        if voice_client is None or voice_client.channel is None:
+            return
+        if before.channel != voice_client.channel and after.channel != voice_client.channel:
+            return
+        if not self.has_listeners(voice_client.channel):
+            self.idle.arm(guild_id, reason="alone", delay=0)
+
+    def has_listeners(self, channel):
+        # Voice states are always cached, members only partially (see utils.startup.member_cache_flags),
+        # so anyone who isn't a cached bot counts as a listener.
+        for user_id in channel.voice_states:
+            member = channel.guild.get_member(user_id)
+            if member is None or not member.bot:
+                return True
+        return False
+
+    async def leave_voice_channel(self, voice_client, guild_id, reason="idle"):
         if voice_client:
-            embed = self.create_embed("👋 Отключение",
-                                      "5 минут бездействия прошло. Я выхожу из голосового канала. Ня.пока!")
             await voice_client.disconnect()
-            state = self.guild_states.get(guild_id)
-            if state:
-                channel = state.get('text_channel')
-                if channel:
-                    await channel.send(embed=embed)
-            del self.guild_states[guild_id]
+        state = self.guild_states.get(guild_id)
+        # A queue restored while nobody was listening never joined voice, so there is no one to say goodbye to.
+        if state and voice_client:
+            channel = state.get('text_channel')
+            if channel:
+                if reason == "alone":
+                    description = "В голосовом канале никого не осталось. Я тоже ухожу. Ня.пока!"
+                else:
+                    description = f"{IDLE_TIMEOUT // 60} минут бездействия прошло. Я выхожу из голосового канала. Ня.пока!"
+                embed = self.create_embed("👋 Отключение", description)
+                await channel.send(embed=embed)
+        self.release_guild(guild_id)
+
+    def release_guild(self, guild_id):
+        state = self.guild_states.pop(guild_id, None)
+        if state:
+            for task in state.get('import_tasks', ()):
+                task.cancel()
+            self.save_queue(guild_id)
+        self.idle.cancel(guild_id)
+        self.prefetcher.clear(guild_id)
+        self.extractor.cancel_guild(guild_id)
 
     def create_embed(self, title, description, color=discord.Color.blue()):
         embed = discord.Embed(title=title, description=description, color=color)
         embed.set_footer(text="🎵 Музыкальный бот | Наслаждайтесь музыкой!")
         return embed
 
-    async def extract_info(self, url, download=False):
+    async def extract_info(self, url, guild_id=None):
+        try:
+            return await self.extractor.extract(url, guild_id=guild_id)
+        except ExtractionCancelled:
+            return None
+        except Exception as e:
+            log.warning("Extraction failed for %s: %s", url, e)
+            return None
+
+    async def extract_playlist(self, url, guild_id=None):
         try:
-            loop = asyncio.get_running_loop()
-            return await loop.run_in_executor(None, lambda: ytdl.extract_info(url, download=download))
+            return await self.extractor.open_playlist(url, guild_id=guild_id)
         except Exception as e:
+            log.warning("Failed to list playlist %s: %s", url, e)
             return None
 
+    async def next_playlist_page(self, cursor):
+        try:
+            return await self.extractor.next_page(cursor, PLAYLIST_PAGE_SIZE)
+        except Exception as e:
+            log.warning("Failed to page playlist entries: %s", e)
+            return []
+
     async def send_error_message(self, channel, content):
         embed = self.create_embed("❌ Ошибка", content, discord.Color.red())
         await channel.send(embed=embed)
 
+    def get_guild_state(self, ctx):
+        guild_id = ctx.guild.id
+        state = self.guild_states.get(guild_id)
+        if state is None:
+            state = self.guild_states[guild_id] = {'queue': GuildQueue(on_change=lambda: self.save_queue(guild_id)), 'last_played': None, 'voice_client': ctx.voice_client, 'text_channel': ctx.channel}
+        return state
+
     async def add_to_queue(self, ctx, url):
         guild_id = ctx.guild.id
-        state = self.guild_states.setdefault(guild_id, {'queue': [], 'last_played': None, 'voice_client': ctx.voice_client, 'text_channel': ctx.channel})
+        state = self.get_guild_state(ctx)
         if "open.spotify.com" in url:
-            added_tracks = await self.add_spotify_to_queue(ctx, url)
-            if added_tracks:
-                tracks_info = "\n".join([f"🎵 {track}" for track in added_tracks[:5]])
-                if len(added_tracks) > 5:
-                    tracks_info += f"\n... и ещё {len(added_tracks) - 5} треков"
-                embed = self.create_embed("🎶 Добавлено в очередь",
-                    f"**Добавлено {len(added_tracks)} треков из Spotify:**\n\n{tracks_info}")
-                embed.add_field(name="🔗 Источник", value="Spotify", inline=True)
-                embed.add_field(name="👤 Добавил", value=ctx.author.mention, inline=True)
-                await ctx.respond(embed=embed)
+            job = await self.add_spotify_to_queue(ctx, url)
+            if job and job.added:
+                job.message = await ctx.respond(embed=self.create_spotify_embed(ctx, job))
+                if job.done:
+                    await self.update_spotify_embed(ctx, job)
             else:
                 await self.send_error_message(ctx.channel, "Не удалось добавить треки из Spotify в очередь")
+        elif YOUTUBE_PLAYLIST_RE.search(url):
+            await self.add_playlist_to_queue(ctx, url)
         else:
-            info = await self.extract_info(url, download=False)
+            info = await self.extract_info(url, guild_id=guild_id)
             if info is None:
                 await self.send_error_message(ctx.channel, f"Не удалось добавить трек в очередь: {url}")
                 return
@@ -86,16 +449,72 @@ class Music(commands.Cog):
                 embed.add_field(name="🔗 Источник", value="YouTube", inline=True)
                 embed.add_field(name="👤 Добавил", value=ctx.author.mention, inline=True)
                 await ctx.respond(embed=embed)
-                for entry in info['entries']:
-                    state['queue'].append(entry)
+                state['queue'].extend(Track.from_info(entry, ctx.author.id) for entry in info['entries'] if entry)
+                self.prefetch_upcoming(guild_id)
             else:
-                state['queue'].append(info)
+                state['queue'].append(Track.from_info(info, ctx.author.id))
+                self.prefetch_upcoming(guild_id)
                 embed = self.create_embed("🎶 Добавлено в очередь", f"**Трек добавлен в очередь:**\n\n🎵 {info['title']}")
                 embed.add_field(name="🔗 Источник", value="YouTube", inline=True)
                 embed.add_field(name="👤 Добавил", value=ctx.author.mention, inline=True)
                 embed.add_field(name="⏱️ Длительность", value=self.format_duration(info.get('duration', 0)), inline=True)
                 await ctx.respond(embed=embed)
 
+    def create_playlist_embed(self, ctx, title, preview, added, loading):
+        tracks_info = "\n".join([f"🎵 {track.title}" for track in preview[:5]])
+        if loading:
+            tracks_info += "\n... остальные треки загружаются"
+        elif added > 5:
+            tracks_info += f"\n... и ещё {added - 5} треков"
+        embed = self.create_embed("🎶 Добавлено в очередь",
+            f"**Добавлено {added} треков из плейлиста {title or ''}:**\n\n{tracks_info}")
+        embed.add_field(name="🔗 Источник", value="YouTube", inline=True)
+        embed.add_field(name="👤 Добавил", value=ctx.author.mention, inline=True)
+        return embed
+
+    async def add_playlist_to_queue(self, ctx, url):
+        state = self.get_guild_state(ctx)
+        cursor = await self.extract_playlist(url, guild_id=ctx.guild.id)
+        if cursor is None:
+            await self.send_error_message(ctx.channel, f"Не удалось добавить плейлист в очередь: {url}")
+            return
+
+        title = cursor.info.get('title')
+        page = [Track.from_info(entry, ctx.author.id) for entry in await self.next_playlist_page(cursor) if entry]
+        if not page:
+            await self.send_error_message(ctx.channel, f"Плейлист пуст или недоступен: {url}")
+            return
+
+        state['queue'].extend(page)
+        self.prefetch_upcoming(ctx.guild.id)
+
+        # A full first page means there may be more; the rest is paged in behind the reply.
+        loading = len(page) >= PLAYLIST_PAGE_SIZE
+        message = await ctx.respond(embed=self.create_playlist_embed(ctx, title, page, len(page), loading))
+        if loading:
+            task = self.loop.create_task(self.page_playlist(ctx, state, cursor, message, title, page[:5]))
+            import_tasks = state.setdefault('import_tasks', set())
+            import_tasks.add(task)
+            task.add_done_callback(import_tasks.discard)
+
+    async def page_playlist(self, ctx, state, cursor, message, title, preview):
+        added = PLAYLIST_PAGE_SIZE
+        while added < PLAYLIST_MAX_TRACKS:
+            page = await self.next_playlist_page(cursor)
+            if not page:
+                break
+            tracks = [Track.from_info(entry, ctx.author.id) for entry in page[:PLAYLIST_MAX_TRACKS - added] if entry]
+            state['queue'].extend(tracks)
+            added += len(tracks)
+            self.prefetch_upcoming(ctx.guild.id)
+            if ctx.voice_client and not ctx.voice_client.is_playing() and not ctx.voice_client.is_paused():
+                await self.play_next_track(ctx)
+
+        try:
+            await message.edit(embed=self.create_playlist_embed(ctx, title, preview, added, False))
+        except discord.HTTPException:
+            pass
+
     def format_duration(self, duration):
         minutes, seconds = divmod(duration, 60)
         hours, minutes = divmod(minutes, 60)
@@ -104,103 +523,192 @@ class Music(commands.Cog):
         else:
             return f"{int(minutes):02d}:{int(seconds):02d}"
 
-    async def add_spotify_to_queue(self, ctx, url: str) -> List[str]:
-        added_tracks = []
-        if "track" in url:
-            track = sp.track(url)
-            search_query = f"{track['name']} {track['artists'][0]['name']}"
-            youtube_url = await self.search_youtube(search_query)
-            if youtube_url:
-                result = await self.add_youtube_to_queue(ctx, youtube_url)
-                if isinstance(result, str):
-                    added_tracks.append(result)
-        elif "album" in url:
-            album = sp.album(url)
-            for track in album['tracks']['items']:
-                search_query = f"{track['name']} {track['artists'][0]['name']}"
-                youtube_url = await self.search_youtube(search_query)
-                if youtube_url:
-                    result = await self.add_youtube_to_queue(ctx, youtube_url)
-                    if isinstance(result, str):
-                        added_tracks.append(result)
-        elif "playlist" in url:
-            playlist = sp.playlist(url)
-            for item in playlist['tracks']['items']:
-                track = item['track']
-                search_query = f"{track['name']} {track['artists'][0]['name']}"
-                youtube_url = await self.search_youtube(search_query)
-                if youtube_url:
-                    result = await self.add_youtube_to_queue(ctx, youtube_url)
-                    if isinstance(result, str):
-                        added_tracks.append(result)
-        return added_tracks
-
-    async def add_youtube_to_queue(self, ctx, url: str) -> Union[str, List[str]]:
-        info = await self.extract_info(url, download=False)
-        if info is None:
-            return f"Не удалось добавить трек в очередь: {url}"
-
-        guild_id = ctx.guild.id
-        state = self.guild_states.setdefault(guild_id, {'queue': [], 'last_played': None, 'voice_client': ctx.voice_client, 'text_channel': ctx.channel})
-
-        if info.get("_type") == "playlist":
-            added_tracks = []
-            for entry in info["entries"]:
-                state['queue'].append(entry)
-                added_tracks.append(entry['title'])
-            return added_tracks
+    def create_spotify_embed(self, ctx, job):
+        tracks_info = "\n".join([f"🎵 {track}" for track in job.added[:5]])
+        if len(job.added) > 5:
+            tracks_info += f"\n... и ещё {len(job.added) - 5} треков"
+        if job.done:
+            description = f"**Добавлено {len(job.added)} треков из Spotify:**\n\n{tracks_info}"
+            if job.failed:
+                description += f"\n\n⚠️ Не удалось найти {job.failed} треков"
         else:
-            state['queue'].append(info)
-            return info['title']
+            description = f"**Загружено {len(job.added)} из {job.total} треков из Spotify...**\n\n{tracks_info}"
+        embed = self.create_embed("🎶 Добавлено в очередь", description)
+        embed.add_field(name="🔗 Источник", value="Spotify", inline=True)
+        embed.add_field(name="👤 Добавил", value=ctx.author.mention, inline=True)
+        return embed
+
+    async def add_spotify_to_queue(self, ctx, url: str) -> Optional[SpotifyImport]:
+        kind, _ = parse_spotify_url(url)
+        if kind is None:
+            return None
+
+        state = self.get_guild_state(ctx)
+
+        # Resolve in the background and hand control back as soon as the first track is queued,
+        # so playback starts while the rest of the playlist is still loading.
+        job = SpotifyImport(url)
+        task = self.loop.create_task(self.import_spotify_tracks(ctx, state, job))
+        import_tasks = state.setdefault('import_tasks', set())
+        import_tasks.add(task)
+        task.add_done_callback(import_tasks.discard)
+        await job.first_ready.wait()
+        return job
+
+    async def import_spotify_tracks(self, ctx, state, job):
+        semaphore = asyncio.Semaphore(SPOTIFY_RESOLVE_CONCURRENCY)
+        pending = asyncio.Queue()
+        tasks = []
+
+        async def resolve(query, spotify_id):
+            async with semaphore:
+                return await self.search_youtube(query, spotify_id=spotify_id, guild_id=ctx.guild.id)
+
+        async def fetch_tracks():
+            try:
+                async for track in spotify.iter_tracks(job.url):
+                    query = f"{track['name']} {track['artists'][0]['name']}"
+                    task = self.loop.create_task(resolve(query, track.get('id')))
+                    tasks.append(task)
+                    pending.put_nowait(task)
+                    job.total += 1
+            except (SpotifyError, aiohttp.ClientError, asyncio.TimeoutError) as e:
+                log.warning("Failed to fetch Spotify tracks for %s: %s", job.url, e)
+            finally:
+                pending.put_nowait(None)
+
+        producer = self.loop.create_task(fetch_tracks())
+        last_update = self.loop.time()
+        try:
+            # Awaiting in playlist order keeps the queue ordered while later tracks resolve concurrently.
+            while (task := await pending.get()) is not None:
+                info = await task
+                if info is None:
+                    job.failed += 1
+                    continue
+
+                track = Track.from_info(info, ctx.author.id)
+                state['queue'].append(track)
+                job.added.append(track.title)
+                self.prefetch_upcoming(ctx.guild.id)
+                if not job.first_ready.is_set():
+                    job.first_ready.set()
+                elif ctx.voice_client and not ctx.voice_client.is_playing() and not ctx.voice_client.is_paused():
+                    # The queue ran dry before this track was resolved.
+                    await self.play_next_track(ctx)
+
+                if job.message and self.loop.time() - last_update >= SPOTIFY_PROGRESS_INTERVAL:
+                    last_update = self.loop.time()
+                    await self.update_spotify_embed(ctx, job)
+        finally:
+            producer.cancel()
+            for task in tasks:
+                task.cancel()
+            job.done = True
+            job.first_ready.set()
+
+        if job.message:
+            await self.update_spotify_embed(ctx, job)
+
+    async def update_spotify_embed(self, ctx, job):
+        try:
+            await job.message.edit(embed=self.create_spotify_embed(ctx, job))
+        except discord.HTTPException:
+            pass
+
+    async def search_youtube(self, query, spotify_id=None, guild_id=None):
+        # A cached entry has no stream URL; download_and_play resolves it when the track comes up.
+        cached = await self.resolution_cache.get(query=query, spotify_id=spotify_id)
+        if cached is not None:
+            return cached
 
-    async def search_youtube(self, query):
         search_url = f"ytsearch1:{query}"
-        info = await self.extract_info(search_url, download=False)
+        info = await self.extract_info(search_url, guild_id=guild_id)
         if info and 'entries' in info and info['entries']:
-            return info['entries'][0]['webpage_url']
+            entry = info['entries'][0]
+            await self.resolution_cache.set(entry, query=query, spotify_id=spotify_id)
+            return entry
         return None
 
-    async def download_and_play(self, ctx, track):
-        if not isinstance(track, dict):
-            await self.send_error_message(ctx.channel, f"Некорректная информация о треке: {track}")
-            await self.play_next_track(ctx)
-            return
-
-        info = track
-        url = info.get('url')
-        webpage_url = info.get('webpage_url')
+    async def resolve_stream(self, track, guild_id=None):
+        cached_path = self.audio_cache.get(track.id) if track.id else None
+        if cached_path:
+            return track.with_stream(cached_path, codec='opus')
+        if is_stream_fresh(track.stream_url):
+            return track
+        if not track.webpage_url:
+            return None
+        extracted_info = await self.extract_info(track.webpage_url, guild_id=guild_id)
+        if extracted_info and 'url' in extracted_info:
+            return track.with_stream(extracted_info['url'], extracted_info.get('duration'), extracted_info.get('acodec'))
+        return None
 
-        if not url and webpage_url:
-            extracted_info = await self.extract_info(webpage_url, download=False)
-            if extracted_info and 'url' in extracted_info:
-                url = extracted_info['url']
-                info = extracted_info
-            else:
-                await self.send_error_message(ctx.channel,
-                                              f"Не удалось получить URL для трека: {info.get('title', 'Unknown')}")
-                await self.play_next_track(ctx)
-                return
+    def create_source(self, track, start_at=None):
+        seek = f"-ss {start_at:.1f} " if start_at else ""
+        if not track.stream_url.startswith(('http://', 'https://')):
+            # Local Ogg/Opus from the audio cache: FFmpeg only remuxes it.
+            return discord.FFmpegOpusAudio(track.stream_url, codec='opus', before_options=seek.strip() or None)
+        return discord.FFmpegOpusAudio(
+            track.stream_url,
+            # Opus sources (YouTube's WebM audio) are copied instead of decoded and re-encoded.
+            codec='opus' if track.stream_codec == 'opus' else None,
+            before_options=f"{seek}-reconnect 1 -reconnect_streamed 1 -reconnect_delay_max 5",
+            options="-vn"
+        )
 
-        if not url:
-            await self.send_error_message(ctx.channel, f"Отсутствует URL для трека: {info.get('title', 'Unknown')}")
-            await self.play_next_track(ctx)
+    def prefetch_upcoming(self, guild_id):
+        state = self.guild_states.get(guild_id)
+        if not state or not state.get('current_playing'):
             return
+        remaining = None
+        if state.get('current_duration'):
+            remaining = state['current_duration'] - self.playback_position(state)
+        self.prefetcher.schedule(guild_id, state['queue'].peek(PREFETCH_DEPTH), remaining)
 
-        source = discord.FFmpegOpusAudio(
-            url,
-            before_options="-reconnect 1 -reconnect_streamed 1 -reconnect_delay_max 5",
-            options="-vn"
-        )
-        ctx.voice_client.play(source, after=lambda e: self.bot.loop.create_task(self.after_playing(ctx, e)))
+    async def download_and_play(self, ctx, track):
+        # Returns False if the track couldn't be started, so the caller moves on to the next one.
+        # Announcing the track is left to play_next_track, outside the per-guild start lock.
+        if not isinstance(track, Track):
+            await self.send_error_message(ctx.channel, f"Некорректная информация о треке: {track}")
+            return False
 
         guild_id = ctx.guild.id
+        state = self.guild_states.get(guild_id)
+        # A track interrupted by a restart picks up where it was (see load_saved_queue).
+        resume_at = state.pop('resume_at', None) if state else None
+        start_at = resume_at[1] if resume_at and resume_at[0] == track.id else None
+        resolved, source = await self.prefetcher.take(guild_id, track)
+        if resolved is None:
+            resolved = await self.resolve_stream(track, guild_id)
+
+        if resolved is None:
+            if track.webpage_url:
+                await self.send_error_message(ctx.channel, f"Не удалось получить URL для трека: {track.title}")
+            else:
+                await self.send_error_message(ctx.channel, f"Отсутствует URL для трека: {track.title}")
+            return False
+
+        if start_at is not None and source is not None:
+            source.cleanup()
+            source = None
+        if source is None:
+            source = self.create_source(resolved, start_at)
+        # The after callback runs on the player thread.
+        ctx.voice_client.play(source, after=lambda e: asyncio.run_coroutine_threadsafe(self.after_playing(ctx, e), self.loop))
+        self.idle.cancel(guild_id)
+        self.loop.create_task(self.audio_cache.record_play(resolved))
+
         state = self.guild_states.get(guild_id)
         if state:
-            state['current_playing'] = f"{info.get('title', 'Неизвестно')} - {webpage_url or 'Нет URL'}"
+            state['current_playing'] = f"{resolved.title} - {resolved.webpage_url or 'Нет URL'}"
+            state['current_track'] = track
+            state['current_duration'] = resolved.duration
+            state['track_started'] = self.loop.time() - (start_at or 0)
+            state.pop('paused_at', None)
             state['last_played'] = discord.utils.utcnow()
-
-        embed = self.create_embed("🎵 Сейчас играет", f"🎶 {state['current_playing']}")
-        await ctx.respond(embed=embed)
+            self.prefetch_upcoming(guild_id)
+            self.save_queue(guild_id)
+        return True
 
     async def after_playing(self, ctx, error=None):
         if error:
@@ -208,10 +716,15 @@ class Music(commands.Cog):
 
         guild_id = ctx.guild.id
         state = self.guild_states.get(guild_id)
+        if guild_id in self.moving:
+            # Stopped by the move itself; /play resumes the queue once it has reconnected.
+            return
 
         if state:
             if not state['queue']:
                 state['current_playing'] = None
+                self.save_queue(guild_id)
+                self.idle.arm(guild_id)
                 embed = self.create_embed("📢 Информация", "Очередь закончилась. Добавьте больше треков!")
                 await ctx.respond(embed=embed)
             else:
@@ -221,20 +734,37 @@ class Music(commands.Cog):
         guild_id = ctx.guild.id
         state = self.guild_states.get(guild_id)
         if state:
-            if not ctx.voice_client or not ctx.voice_client.is_connected():
-                try:
-                    await ctx.author.voice.channel.connect()
-                except Exception as e:
-                    await self.send_error_message(ctx.channel, "Не удалось подключиться к голосовому каналу. Пожалуйста, попробуйте снова.")
-                    return
-
-            if state['queue']:
-                next_track = state['queue'].pop(0)
-                await self.download_and_play(ctx, next_track)
-            else:
-                embed = self.create_embed("📢 Информация", "Очередь пуста!")
+            # /play, a background import and after_playing can all find the player idle. They take turns,
+            # and each re-checks the player once it has the lock, so only one of them starts a track.
+            # The lock is released as soon as play() returns: the track may end before the reply below
+            # goes out, and its after_playing must be able to start the next one.
+            async with state.setdefault('starting', asyncio.Lock()):
+                now_playing = await self.start_next_track(ctx, state)
+            if now_playing:
+                embed = self.create_embed("🎵 Сейчас играет", f"🎶 {now_playing}")
                 await ctx.respond(embed=embed)
-                state['current_playing'] = None
+
+    async def start_next_track(self, ctx, state):
+        # Returns the started track's description, or None if nothing was started.
+        guild_id = ctx.guild.id
+        if not ctx.voice_client or not ctx.voice_client.is_connected():
+            try:
+                await ctx.author.voice.channel.connect()
+            except Exception as e:
+                await self.send_error_message(ctx.channel, "Не удалось подключиться к голосовому каналу. Пожалуйста, попробуйте снова.")
+                return
+
+        if ctx.voice_client.is_playing() or ctx.voice_client.is_paused():
+            return
+        while state['queue']:
+            next_track = state['queue'].popleft()
+            if await self.download_and_play(ctx, next_track):
+                return state.get('current_playing')
+        embed = self.create_embed("📢 Информация", "Очередь пуста!")
+        await ctx.respond(embed=embed)
+        state['current_playing'] = None
+        self.save_queue(guild_id)
+        self.idle.arm(guild_id)
 
     @commands.slash_command(name="play", description="Воспроизвести музыку с Spotify или YouTube")
     async def play(self, ctx, *, url: Option(str, "URL или название трека", required=True)):
@@ -246,9 +776,15 @@ class Music(commands.Cog):
             await ctx.respond(embed=embed)
             return
 
+        await self.restore_guild(ctx.guild.id)
         if ctx.voice_client and ctx.voice_client.channel != ctx.author.voice.channel:
-            await ctx.voice_client.disconnect()
-            await ctx.author.voice.channel.connect()
+            # The leave event arrives while connect() waits for the new channel; the queue stays.
+            self.moving.add(ctx.guild.id)
+            try:
+                await ctx.voice_client.disconnect()
+                await ctx.author.voice.channel.connect()
+            finally:
+                self.moving.discard(ctx.guild.id)
         elif not ctx.voice_client:
             await ctx.author.voice.channel.connect()
 
@@ -257,76 +793,48 @@ class Music(commands.Cog):
         if not ctx.voice_client.is_playing():
             await self.play_next_track(ctx)
 
-    @commands.slash_command(name="queue", description="Показать текущую очередь")
-    async def show_queue(self, ctx):
-        guild_id = ctx.guild.id
-        state = self.guild_states.get(guild_id)
-        if state:
-            queue = state.get('queue', [])
-            current_playing = state.get('current_playing')
-
-            if queue or current_playing:
-                queue_pages = []
-                items_per_page = 10
-
-                for i in range(0, len(queue), items_per_page):
-                    page_items = queue[i:i + items_per_page]
-                    embed = discord.Embed(title="🎶 Текущая очередь", color=discord.Color.blue())
+    def create_queue_embed(self, state, page):
+        queue = state['queue']
+        page_count = max(1, -(-len(queue) // QUEUE_PAGE_SIZE))
+        page = min(max(page, 0), page_count - 1)
+        embed = discord.Embed(title="🎶 Текущая очередь", color=discord.Color.blue())
 
-                    if current_playing and i == 0:
-                        embed.add_field(name="▶️ Сейчас играет", value=f"**{current_playing}**", inline=False)
+        current_playing = state.get('current_playing')
+        if current_playing and page == 0:
+            embed.add_field(name="▶️ Сейчас играет", value=f"**{current_playing}**", inline=False)
 
-                    for idx, track in enumerate(page_items, i + 1):
-                        embed.add_field(name=f"{idx}. {track['title']}",
-                                        value=f"[🔗]({track['webpage_url']}) | ⏱️ {self.format_duration(track.get('duration', 0))}",
-                                        inline=False)
+        # Only this page's tracks are read from the live queue.
+        start = page * QUEUE_PAGE_SIZE
+        for idx, track in enumerate(queue.slice(start, start + QUEUE_PAGE_SIZE), start + 1):
+            embed.add_field(name=f"{idx}. {track.title}",
+                            value=f"[🔗]({track.webpage_url}) | ⏱️ {self.format_duration(track.duration or 0)}",
+                            inline=False)
 
-                    embed.set_footer(
-                        text=f"Страница {i // items_per_page + 1} из {-(-len(queue) // items_per_page)} | 🎵 Музыкальный бот")
-                    queue_pages.append(embed)
-
-                if queue_pages:
-                    message = await ctx.respond(embed=queue_pages[0])
+        embed.set_footer(text=f"Страница {page + 1} из {page_count} | 🎵 Музыкальный бот")
+        return embed
 
-                    if len(queue_pages) > 1:
-                        await self.paginate(ctx, message, queue_pages)
-                else:
-                    embed = self.create_embed("Текущая очередь", "В очереди нет треков, но сейчас что-то играет.")
-                    await ctx.respond(embed=embed)
-            else:
-                embed = self.create_embed("Очередь пуста", "Добавьте треки с помощью команды **/play**!")
-                await ctx.respond(embed=embed)
-        else:
+    @commands.slash_command(name="queue", description="Показать текущую очередь")
+    async def show_queue(self, ctx):
+        # A pending restore reconnects and resolves the first stream, well past the interaction deadline.
+        await ctx.defer()
+        await self.restore_guild(ctx.guild.id)
+        state = self.guild_states.get(ctx.guild.id)
+        if not state or not (state['queue'] or state.get('current_playing')):
             embed = self.create_embed("Очередь пуста", "Добавьте треки с помощью команды **/play**!")
             await ctx.respond(embed=embed)
+            return
 
-    async def paginate(self, ctx, message, embeds):
-        current_page = 0
-
-        buttons = [
-            discord.ui.Button(emoji="⬅️", style=discord.ButtonStyle.primary),
-            discord.ui.Button(emoji="➡️", style=discord.ButtonStyle.primary)
-        ]
-
-        async def button_callback(interaction):
-            nonlocal current_page
-            if interaction.user != ctx.author:
-                await interaction.response.send_message("Вы не можете управлять этой страницей.", ephemeral=True)
-                return
-            if interaction.component.emoji.name == "⬅️":
-                current_page = (current_page - 1) % len(embeds)
-            elif interaction.component.emoji.name == "➡️":
-                current_page = (current_page + 1) % len(embeds)
-            await interaction.response.edit_message(embed=embeds[current_page])
-
-        for button in buttons:
-            button.callback = button_callback
+        if not state['queue']:
+            embed = self.create_embed("Текущая очередь", "В очереди нет треков, но сейчас что-то играет.")
+            await ctx.respond(embed=embed)
+            return
 
-        view = discord.ui.View()
-        for button in buttons:
-            view.add_item(button)
+        if len(state['queue']) <= QUEUE_PAGE_SIZE:
+            await ctx.respond(embed=self.create_queue_embed(state, 0))
+            return
 
-        await message.edit(view=view)
+        view = QueuePaginator(self, ctx.guild.id, ctx.author.id)
+        view.message = await ctx.respond(embed=self.create_queue_embed(state, 0), view=view)
 
     @commands.slash_command(name="skip", description="Пропустить текущий трек")
     async def skip(self, ctx):
@@ -342,6 +850,10 @@ class Music(commands.Cog):
     async def pause(self, ctx):
         if ctx.voice_client and ctx.voice_client.is_playing():
             ctx.voice_client.pause()
+            state = self.guild_states.get(ctx.guild.id)
+            if state:
+                state['paused_at'] = self.loop.time()
+            self.idle.arm(ctx.guild.id)
             embed = self.create_embed("⏸️ Пауза", "Музыка приостановлена. Используйте /resume, чтобы продолжить.")
             await ctx.respond(embed=embed)
         else:
@@ -352,6 +864,10 @@ class Music(commands.Cog):
     async def resume(self, ctx):
         if ctx.voice_client and ctx.voice_client.is_paused():
             ctx.voice_client.resume()
+            state = self.guild_states.get(ctx.guild.id)
+            if state and 'paused_at' in state:
+                state['track_started'] += self.loop.time() - state.pop('paused_at')
+            self.idle.cancel(ctx.guild.id)
             embed = self.create_embed("▶️ Возобновление", "Музыка снова играет!")
             await ctx.respond(embed=embed)
         else:
@@ -360,12 +876,11 @@ class Music(commands.Cog):
 
     @commands.slash_command(name="stop", description="Остановить воспроизведение и очистить очередь")
     async def stop(self, ctx):
+        self.discard_restore(ctx.guild.id)
         if ctx.voice_client:
             ctx.voice_client.stop()
             await ctx.voice_client.disconnect()
-            guild_id = ctx.guild.id
-            if guild_id in self.guild_states:
-                del self.guild_states[guild_id]
+            self.release_guild(ctx.guild.id)
             embed = self.create_embed("🛑 Остановлено",
                                       "Воспроизведение остановлено, очередь очищена. До новых встреч!")
             await ctx.respond(embed=embed)
@@ -1,13 +1,99 @@
+import asyncio
+import logging
 import random
 from datetime import datetime, timedelta
 import discord
-from discord.ext import commands
+from discord.ext import commands, tasks
 from utils.database import Database
+from utils.phrases import PhraseCache
+from utils.role_expiry import RoleExpiryScheduler
+from utils.role_index import RoleIndex
+from utils.startup import owns_every_guild, owns_guild
+
+log = logging.getLogger(__name__)
 
 class TYD(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
         self.db = Database()
+        self.phrases = PhraseCache(self.db)
+        self.role_expiry = RoleExpiryScheduler(self.db, self.remove_expired_role,
+                                               owns_guild=lambda guild_id: owns_guild(self.bot, guild_id))
+        self.role_expiry_started = False
+        self.roles = RoleIndex()
+
+    def cog_unload(self):
+        self.db_watchdog.cancel()
+        self.role_expiry.stop()
+
+    @commands.Cog.listener()
+    async def on_ready(self):
+        startup = self.bot.startup
+        # Open the pool (and prepare the hot statements) before the first /tyd instead of during it.
+        # If it fails, the loads below try to connect again on their own.
+        try:
+            await startup.timed("db_connect", self.db.connect())
+        except Exception as e:
+            log.warning("TYD warm-up step failed: %s", e)
+        # Phrases and pending role expirations are independent reads; load them side by side.
+        results = await asyncio.gather(
+            startup.timed("phrases", self.load_phrases()),
+            startup.timed("role_expiry", self.start_role_expiry()),
+            return_exceptions=True,
+        )
+        for result in results:
+            if isinstance(result, Exception):
+                log.warning("TYD warm-up step failed: %s", result)
+        # Started whatever happened above: it retries anything that didn't come up.
+        if not self.db_watchdog.is_running():
+            self.db_watchdog.start()
+
+    async def load_phrases(self):
+        if not self.phrases.loaded:
+            await self.phrases.load()
+            await self.phrases.listen()
+
+    async def start_role_expiry(self):
+        if not self.role_expiry_started:
+            # Set up front so overlapping callers start it once; cleared again if loading fails, so a later call retries.
+            self.role_expiry_started = True
+            try:
+                await self.role_expiry.start()
+            except Exception:
+                self.role_expiry_started = False
+                raise
+
+    @commands.Cog.listener()
+    async def on_guild_role_create(self, role):
+        self.roles.invalidate(role.guild.id)
+
+    @commands.Cog.listener()
+    async def on_guild_role_update(self, before, after):
+        self.roles.invalidate(after.guild.id)
+
+    @commands.Cog.listener()
+    async def on_guild_role_delete(self, role):
+        self.roles.invalidate(role.guild.id)
+
+    @commands.Cog.listener()
+    async def on_guild_remove(self, guild):
+        self.roles.invalidate(guild.id)
+
+    @tasks.loop(minutes=5)
+    async def db_watchdog(self):
+        # Starts role expiry if it failed at startup, and polls phrases while LISTEN is down (no trigger
+        # permissions, a dropped connection, or a failed first load: refresh_if_changed then loads them).
+        # An exception would end the loop, so each step logs its own.
+        try:
+            await self.start_role_expiry()
+        except Exception as e:
+            log.warning("Failed to start role expiry: %s", e)
+        if not self.phrases.listening or not self.phrases.loaded:
+            try:
+                await self.phrases.listen()
+                await self.phrases.refresh_if_changed()
+            except Exception as e:
+                log.warning("Failed to refresh phrases: %s", e)
 
     @commands.slash_command(name="tyd", description="Test your destiny")
     @commands.cooldown(1, 86400, commands.BucketType.user)
@@ -32,19 +118,68 @@ class TYD(commands.Cog):
         elif 11 <= random_number < 30:
             range_key, role_to_assign, days = "11-29", "Средний класс", 2
 
-        if role_to_assign:
-            expiration = datetime.now() + timedelta(days=days)
-            await self.assign_role_and_update_db(ctx, role_to_assign, expiration)
+        expiration = datetime.now() + timedelta(days=days) if role_to_assign else None
+        write_db = role_to_assign is not None
 
-        messages = await self.db.get_messages_for_range(range_key)
-        message = random.choice(messages).format(user_mention=user_mention, bot_mention=bot_member.mention,
-                                                 random_number=random_number)
+        phrase = self.phrases.choice(range_key)
+        if phrase is None:
+            if role_to_assign:
+                # Phrase cache is cold: the role upsert rides along with the phrase read.
+                messages = await self.db.assign_role_and_get_messages(ctx.author.id, role_to_assign, expiration,
+                                                                      ctx.guild.id, range_key)
+                write_db = False
+            else:
+                messages = await self.db.get_messages_for_range(range_key)
+            phrase = random.choice(messages)
+        message = phrase.format(user_mention=user_mention, bot_mention=bot_member.mention,
+                                random_number=random_number)
+        # The reply doesn't depend on the role or the DB row, so it goes out first.
         await ctx.respond(message)
 
-    async def assign_role_and_update_db(self, ctx, role_name, expiration):
-        role = discord.utils.get(ctx.guild.roles, name=role_name)
+        if role_to_assign:
+            await self.assign_role_and_update_db(ctx, role_to_assign, expiration, write_db)
+
+    async def assign_role_and_update_db(self, ctx, role_name, expiration, write_db=True):
+        # The role edit and the upsert are independent round trips to Discord and Postgres.
+        steps = [self.add_role(ctx, role_name)]
+        if write_db:
+            steps.append(self.db.assign_role(ctx.author.id, role_name, expiration, ctx.guild.id))
+        for result in await asyncio.gather(*steps, return_exceptions=True):
+            if isinstance(result, Exception):
+                log.warning("Failed to assign role %s to %s in guild %s: %s", role_name, ctx.author.id, ctx.guild.id, result)
+        self.role_expiry.schedule(ctx.author.id, role_name, ctx.guild.id, expiration)
+
+    async def add_role(self, ctx, role_name):
+        role = self.roles.get(ctx.guild, role_name)
+        if role is None:
+            log.warning("Role %s does not exist in guild %s", role_name, ctx.guild.id)
+            return
         await ctx.author.add_roles(role)
-        await self.db.assign_role(ctx.author.id, role_name, expiration)
+
+    async def remove_expired_role(self, guild_id, user_id, role_name):
+        # Rows written before guild_id was recorded have to be looked up in every guild.
+        guilds = [self.bot.get_guild(guild_id)] if guild_id else self.bot.guilds
+        removed = False
+        for guild in guilds:
+            if guild is None:
+                continue
+            role = self.roles.get(guild, role_name)
+            if role is None:
+                continue
+            member = guild.get_member(user_id)
+            try:
+                if member is None:
+                    member = await guild.fetch_member(user_id)
+                if role in member.roles:
+                    await member.remove_roles(role, reason="Срок действия роли истёк")
+                    removed = True
+            except (discord.NotFound, discord.Forbidden) as e:
+                log.warning("Cannot remove role %s from %s in guild %s: %s", role_name, user_id, guild.id, e)
+        if guild_id is None and not removed and not owns_every_guild(self.bot):
+            # Every cluster process sees a guild-less row but searches only its own guilds; the row is
+            # left for the process whose guild still has the role.
+            return None
+        return True
 
 def setup(bot):
     bot.add_cog(TYD(bot))
\ No newline at end of file
@@ -1,19 +1,48 @@
+import time
+
+# Taken before the heavy imports so the startup timings include them.
+process_started = time.perf_counter()
+
+import logging
 import os
+import sys
 from datetime import timedelta
 from dotenv import load_dotenv
 
 from discord.ext import commands
 import discord
 
-intents = discord.Intents.all()
-bot = commands.Bot(intents=intents)
+from utils.metrics import instrument_commands, start_metrics_server
+from utils.startup import create_bot, is_cluster_launcher, launch_clusters
+
+logging.basicConfig(level=logging.INFO)
 
 # Load environment variables from .env file
 load_dotenv()
 
+if is_cluster_launcher():
+    # CLUSTER_COUNT > 1: this process only starts one bot process per group of shards.
+    sys.exit(launch_clusters(__file__, os.getenv('DISCORD_TOKEN')))
+
+bot = create_bot(process_started)
+bot.startup.mark("imports")
+
+instrument_commands(bot)
+metrics_runner = None
+
+async def on_connect():
+    bot.startup.mark("gateway_connected")
+
+# A listener, not @bot.event: the default on_connect handler syncs the slash commands.
+bot.add_listener(on_connect)
+
 @bot.event
 async def on_ready():
+    global metrics_runner
     print(f"We have logged in as {bot.user}")
+    bot.startup.mark("ready")
+    if metrics_runner is None:
+        metrics_runner = await start_metrics_server()
 
 @bot.event
 async def on_application_command_error(ctx, error):
@@ -28,5 +57,7 @@ async def on_application_command_error(ctx, error):
 # Load extensions
 bot.load_extension("cogs.tyd")
 bot.load_extension("cogs.music")
+bot.load_extension("cogs.admin")
+bot.startup.mark("extensions")
 
 bot.run(os.getenv('DISCORD_TOKEN'))
\ No newline at end of file
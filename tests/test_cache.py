@@ -0,0 +1,46 @@
+import asyncio
+import sqlite3
+
+from utils.cache import ResolutionCache
+
+INFO = {'id': 'video1', 'title': 'Track', 'webpage_url': 'https://youtu.be/video1', 'duration': 200}
+
+
+class LockedCache(ResolutionCache):
+    def _load(self, lookup_key):
+        raise sqlite3.OperationalError("database is locked")
+
+    def _store(self, *args):
+        raise sqlite3.OperationalError("database is locked")
+
+
+def test_database_errors_count_as_misses(tmp_path):
+    async def scenario():
+        cache = LockedCache(path=str(tmp_path / "music.db"))
+        try:
+            assert await cache.get(query="track") is None
+            await cache.set(INFO, query="track")
+            # The write is dropped on disk but still served from memory.
+            assert (await cache.get(query="track"))['id'] == 'video1'
+            assert cache.stats == {'memory_hits': 1, 'disk_hits': 0, 'misses': 1}
+        finally:
+            cache.close()
+
+    asyncio.run(scenario())
+
+
+def test_lookup_survives_a_restart(tmp_path):
+    async def scenario():
+        path = str(tmp_path / "music.db")
+        cache = ResolutionCache(path=path)
+        await cache.set(INFO, query="Track ")
+        cache.close()
+
+        cache = ResolutionCache(path=path)
+        try:
+            assert (await cache.get(query="track"))['webpage_url'] == INFO['webpage_url']
+            assert cache.stats['disk_hits'] == 1
+        finally:
+            cache.close()
+
+    asyncio.run(scenario())
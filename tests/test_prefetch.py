@@ -0,0 +1,75 @@
+import asyncio
+import time
+
+from utils.prefetch import StreamPrefetcher
+from utils.queue_manager import Track
+
+
+def make_track(index):
+    return Track(id=f"video{index}", title=f"Track {index}", webpage_url=f"https://youtu.be/video{index}")
+
+
+class SlowResolver:
+    def __init__(self, latency):
+        self.latency = latency
+        self.calls = 0
+
+    async def __call__(self, track, guild_id):
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        expire = int(time.time()) + 3600
+        return Track(track.id, track.title, track.webpage_url,
+                     stream_url=f"https://rr1.googlevideo.com/videoplayback?id={track.id}&expire={expire}")
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_take_waits_for_a_resolve_still_in_flight():
+    async def scenario():
+        resolver = SlowResolver(latency=0.05)
+        prefetcher = StreamPrefetcher(resolver, create_source=lambda track: None)
+        upcoming = [make_track(1), make_track(2)]
+        prefetcher.schedule(1, upcoming)
+
+        resolved, source = await prefetcher.take(1, upcoming[0])
+
+        assert resolved is not None and resolved.stream_url
+        assert resolved.id == upcoming[0].id
+        assert source is None
+        assert resolver.calls == 2
+        prefetcher.clear(1)
+
+    run(scenario())
+
+
+def test_take_after_the_resolve_finished():
+    async def scenario():
+        resolver = SlowResolver(latency=0)
+        prefetcher = StreamPrefetcher(resolver, create_source=lambda track: None)
+        track = make_track(1)
+        prefetcher.schedule(1, [track])
+        await asyncio.sleep(0.01)
+
+        resolved, _ = await prefetcher.take(1, track)
+        assert resolved.id == track.id
+        assert await prefetcher.take(1, track) == (None, None)
+        assert resolver.calls == 1
+
+    run(scenario())
+
+
+def test_dropped_track_is_not_taken():
+    async def scenario():
+        resolver = SlowResolver(latency=0.05)
+        prefetcher = StreamPrefetcher(resolver, create_source=lambda track: None)
+        first, second = make_track(1), make_track(2)
+        prefetcher.schedule(1, [first])
+        prefetcher.schedule(1, [second])
+
+        assert await prefetcher.take(1, first) == (None, None)
+        resolved, _ = await prefetcher.take(1, second)
+        assert resolved.id == second.id
+
+    run(scenario())
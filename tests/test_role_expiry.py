@@ -0,0 +1,232 @@
+import asyncio
+from datetime import datetime, timedelta
+
+from benchmarks.fakes import FakeDatabase, FakeGuild, FakeHTTP
+from utils.role_expiry import RETRY_DELAY, RoleExpiryScheduler
+
+ROLE = "Грешник"
+START = datetime(2024, 1, 1, 12, 0)
+
+
+class FakeClock:
+    def __init__(self, now=START):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, **kwargs):
+        self.now += timedelta(**kwargs)
+
+
+class RecordingDatabase(FakeDatabase):
+    def __init__(self):
+        super().__init__({}, latency=0)
+        self.deleted = []
+
+    async def delete_roles(self, roles):
+        self.deleted.append(sorted(roles))
+        await super().delete_roles(roles)
+
+
+class Harness:
+    def __init__(self, guilds=1, failures=0, elsewhere=False):
+        self.clock = FakeClock()
+        self.db = RecordingDatabase()
+        self.guilds = {}
+        for _ in range(guilds):
+            guild = FakeGuild(FakeHTTP(latency=0), role_names=(ROLE,))
+            self.guilds[guild.id] = guild
+        # The first ``failures`` removals report failure, like a Discord error or a missing permission.
+        self.failures = failures
+        # The role lives in a guild run by another cluster process.
+        self.elsewhere = elsewhere
+        self.scheduler = RoleExpiryScheduler(self.db, self.remove_role, clock=self.clock,
+                                             batch_window=timedelta(seconds=5))
+
+    async def remove_role(self, guild_id, user_id, role_name):
+        if self.elsewhere:
+            return None
+        if self.failures:
+            self.failures -= 1
+            return False
+        guild = self.guilds[guild_id]
+        role = next(role for role in guild.roles if role.name == role_name)
+        await guild.get_member(user_id).remove_roles(role)
+        return True
+
+    async def assign(self, guild, member, delay):
+        role = next(role for role in guild.roles if role.name == ROLE)
+        await member.add_roles(role)
+        expiration = self.clock() + delay
+        await self.db.assign_role(member.id, ROLE, expiration, guild.id)
+        self.scheduler.schedule(member.id, ROLE, guild.id, expiration)
+
+    def has_role(self, guild, member):
+        return any(role in member.roles for role in guild.roles)
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_roles_due_within_the_window_expire_as_one_batch():
+    async def scenario():
+        harness = Harness()
+        guild = next(iter(harness.guilds.values()))
+        members = [guild.add_member(in_voice=False) for _ in range(3)]
+        await harness.assign(guild, members[0], timedelta(minutes=1))
+        await harness.assign(guild, members[1], timedelta(minutes=1, seconds=3))
+        await harness.assign(guild, members[2], timedelta(hours=1))
+
+        assert harness.scheduler.pop_due() == []
+        harness.clock.advance(minutes=1)
+        await harness.scheduler.expire(harness.scheduler.pop_due())
+
+        assert harness.db.deleted == [sorted((member.id, ROLE, guild.id) for member in members[:2])]
+        assert [harness.has_role(guild, member) for member in members] == [False, False, True]
+        assert len(harness.scheduler) == 1
+
+    run(scenario())
+
+
+def test_failed_removal_is_retried_later():
+    async def scenario():
+        harness = Harness(failures=1)
+        guild = next(iter(harness.guilds.values()))
+        member = guild.add_member(in_voice=False)
+        await harness.assign(guild, member, timedelta(minutes=1))
+
+        harness.clock.advance(minutes=1)
+        await harness.scheduler.expire(harness.scheduler.pop_due())
+        assert harness.db.deleted == [[]]
+        assert harness.has_role(guild, member)
+        assert len(harness.scheduler) == 1
+
+        harness.clock.advance(seconds=RETRY_DELAY.total_seconds() - 10)
+        assert harness.scheduler.pop_due() == []
+        harness.clock.advance(seconds=10)
+        await harness.scheduler.expire(harness.scheduler.pop_due())
+        assert harness.db.deleted[-1] == [(member.id, ROLE, guild.id)]
+        assert not harness.has_role(guild, member)
+        assert len(harness.scheduler) == 0
+
+    run(scenario())
+
+
+def test_reassigned_role_skips_the_stale_heap_entry():
+    async def scenario():
+        harness = Harness()
+        guild = next(iter(harness.guilds.values()))
+        member = guild.add_member(in_voice=False)
+        await harness.assign(guild, member, timedelta(days=1))
+        harness.clock.advance(hours=12)
+        await harness.assign(guild, member, timedelta(days=2))
+
+        harness.clock.advance(hours=12)
+        assert harness.scheduler.pop_due() == []
+        assert harness.has_role(guild, member)
+
+        harness.clock.advance(days=2)
+        assert harness.scheduler.pop_due() == [(member.id, ROLE, guild.id)]
+
+    run(scenario())
+
+
+def test_role_rerolled_in_another_guild_expires_the_previous_one():
+    async def scenario():
+        harness = Harness(guilds=2)
+        first, second = harness.guilds.values()
+        member = first.add_member(in_voice=False)
+        second.members[member.id] = member
+        await harness.assign(first, member, timedelta(days=1))
+        harness.clock.advance(hours=1)
+        await harness.assign(second, member, timedelta(days=2))
+
+        # The roles row now belongs to the second guild, so the first guild's role goes right away.
+        due = harness.scheduler.pop_due()
+        assert due == [(member.id, ROLE, first.id)]
+        await harness.scheduler.expire(due)
+        assert not harness.has_role(first, member)
+        assert harness.has_role(second, member)
+        # The row belongs to the second guild now and is left alone.
+        assert harness.db.deleted == [[]]
+        assert harness.db.roles[(member.id, ROLE)][1] == second.id
+        assert len(harness.scheduler) == 1
+
+        harness.clock.advance(days=2)
+        assert harness.scheduler.pop_due() == [(member.id, ROLE, second.id)]
+
+    run(scenario())
+
+
+def test_role_owned_by_another_process_keeps_its_row():
+    async def scenario():
+        harness = Harness(elsewhere=True)
+        guild = next(iter(harness.guilds.values()))
+        member = guild.add_member(in_voice=False)
+        await harness.assign(guild, member, timedelta(minutes=1))
+
+        harness.clock.advance(minutes=1)
+        await harness.scheduler.expire(harness.scheduler.pop_due())
+        assert harness.db.deleted == [[]]
+        assert (member.id, ROLE) in harness.db.roles
+        # Not retried either: the process that has the role expires it.
+        assert len(harness.scheduler) == 0
+
+    run(scenario())
+
+
+async def wait_until(condition, timeout=1):
+    # Real time, in small steps: the scheduler's own sleep is only cut short by a wakeup or a due entry.
+    for _ in range(int(timeout / 0.01)):
+        if condition():
+            return True
+        await asyncio.sleep(0.01)
+    return condition()
+
+
+def test_start_loads_pending_rows_and_expires_overdue_ones():
+    async def scenario():
+        harness = Harness()
+        guild = next(iter(harness.guilds.values()))
+        overdue, later = guild.add_member(in_voice=False), guild.add_member(in_voice=False)
+        await harness.assign(guild, overdue, timedelta(minutes=1))
+        await harness.assign(guild, later, timedelta(hours=1))
+        # A restart: the new scheduler only knows what is in the roles table.
+        harness.scheduler = RoleExpiryScheduler(harness.db, harness.remove_role, clock=harness.clock,
+                                                batch_window=timedelta(seconds=5))
+        harness.clock.advance(minutes=2)
+
+        await harness.scheduler.start()
+        try:
+            assert await wait_until(lambda: not harness.has_role(guild, overdue))
+            assert harness.has_role(guild, later)
+            assert len(harness.scheduler) == 1
+            assert (later.id, ROLE) in harness.db.roles and (overdue.id, ROLE) not in harness.db.roles
+        finally:
+            harness.scheduler.stop()
+
+    run(scenario())
+
+
+def test_earlier_schedule_wakes_the_sleeping_scheduler():
+    async def scenario():
+        harness = Harness()
+        guild = next(iter(harness.guilds.values()))
+        first, second = guild.add_member(in_voice=False), guild.add_member(in_voice=False)
+        await harness.scheduler.start()
+        try:
+            await harness.assign(guild, first, timedelta(hours=1))
+            # Now asleep until the hour is up.
+            await asyncio.sleep(0.05)
+            assert harness.has_role(guild, first)
+
+            await harness.assign(guild, second, timedelta(0))
+            assert await wait_until(lambda: not harness.has_role(guild, second))
+            assert harness.has_role(guild, first)
+            assert len(harness.scheduler) == 1
+        finally:
+            harness.scheduler.stop()
+
+    run(scenario())
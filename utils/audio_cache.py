@@ -0,0 +1,123 @@
+import asyncio
+import logging
+import os
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.music_utils import AUDIO_CACHE_DIR, create_ytdl
+
+log = logging.getLogger(__name__)
+
+
+class AudioCache:
+    def __init__(self, play_counter, directory=None, max_bytes=None, min_plays=None):
+        # play_counter(video_id) -> total plays, persisted elsewhere so popularity survives restarts.
+        self.play_counter = play_counter
+        self.directory = directory or AUDIO_CACHE_DIR
+        self.max_bytes = max_bytes or int(os.getenv("AUDIO_CACHE_MAX_BYTES", 2 * 1024 ** 3))
+        self.min_plays = min_plays or int(os.getenv("AUDIO_CACHE_MIN_PLAYS", 3))
+        # video_id -> file size, least recently played first.
+        self._entries = OrderedDict()
+        self._total_bytes = 0
+        self._queue = None
+        self._queued = set()
+        self._worker = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="audio-cache")
+
+    def _scan(self):
+        os.makedirs(os.path.join(self.directory, 'tmp'), exist_ok=True)
+        files = []
+        for name in os.listdir(self.directory):
+            if name.endswith('.opus'):
+                stat = os.stat(os.path.join(self.directory, name))
+                files.append((stat.st_mtime, name[:-len('.opus')], stat.st_size))
+        return sorted(files)
+
+    async def load(self):
+        # Scanning a full cache directory is slow enough to keep off the startup path; until it finishes
+        # lookups simply miss.
+        loop = asyncio.get_running_loop()
+        files = await loop.run_in_executor(self._executor, self._scan)
+        # Anything cached since startup is more recent than what was already on disk.
+        entries = OrderedDict((video_id, size) for _, video_id, size in files if video_id not in self._entries)
+        entries.update(self._entries)
+        self._entries = entries
+        self._total_bytes = sum(entries.values())
+        self._evict()
+
+    @property
+    def total_bytes(self):
+        return self._total_bytes
+
+    def path(self, video_id):
+        return os.path.join(self.directory, f"{video_id}.opus")
+
+    def get(self, video_id):
+        if video_id not in self._entries:
+            return None
+        path = self.path(video_id)
+        if not os.path.exists(path):
+            self._total_bytes -= self._entries.pop(video_id)
+            return None
+        self._entries.move_to_end(video_id)
+        # mtime is the LRU order after a restart.
+        os.utime(path)
+        return path
+
+    async def record_play(self, track):
+        if not track.id or not track.webpage_url or track.id in self._entries or track.id in self._queued:
+            return
+        # Runs fire-and-forget after a track starts, so a failing counter only costs this play.
+        try:
+            plays = await self.play_counter(track.id)
+        except Exception as e:
+            log.warning("Failed to count a play of %s: %s", track.id, e)
+            return
+        if plays >= self.min_plays:
+            self._enqueue(track.id, track.webpage_url)
+
+    def _enqueue(self, video_id, url):
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.get_running_loop().create_task(self._fill())
+        self._queued.add(video_id)
+        self._queue.put_nowait((video_id, url))
+
+    async def _fill(self):
+        # One download at a time in its own thread, so cache fills never compete with playback extraction.
+        loop = asyncio.get_running_loop()
+        while True:
+            video_id, url = await self._queue.get()
+            try:
+                size = await loop.run_in_executor(self._executor, self._download, video_id, url)
+            except Exception as e:
+                log.warning("Failed to cache audio for %s: %s", video_id, e)
+                continue
+            finally:
+                self._queued.discard(video_id)
+            self._entries[video_id] = size
+            self._total_bytes += size
+            self._evict()
+            log.info("Cached %s (%d bytes, %d bytes total)", video_id, size, self._total_bytes)
+
+    def _download(self, video_id, url):
+        create_ytdl('cache').download([url])
+        # Downloads land in tmp/ and are moved in whole, so a crash never leaves a truncated cache entry.
+        temp_path = os.path.join(self.directory, 'tmp', f"{video_id}.opus")
+        os.replace(temp_path, self.path(video_id))
+        return os.path.getsize(self.path(video_id))
+
+    def _evict(self):
+        while self._total_bytes > self.max_bytes and self._entries:
+            video_id, size = self._entries.popitem(last=False)
+            self._total_bytes -= size
+            try:
+                os.remove(self.path(video_id))
+            except FileNotFoundError:
+                pass
+
+    def close(self):
+        if self._worker is not None:
+            self._worker.cancel()
+        self._executor.shutdown(wait=False, cancel_futures=True)
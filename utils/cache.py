@@ -0,0 +1,164 @@
+import json
+import logging
+import os
+import re
+import sqlite3
+import time
+from collections import OrderedDict
+
+from utils.sqlite_store import SQLiteStore
+
+log = logging.getLogger(__name__)
+
+# Only these fields are kept; stream URLs expire within hours and are never persisted.
+METADATA_FIELDS = ('id', 'title', 'webpage_url', 'duration')
+
+
+def normalize_query(query):
+    return re.sub(r"\s+", " ", query).strip().casefold()
+
+
+class LRUCache:
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+
+    def get(self, key):
+        item = self._data.get(key)
+        if item is None:
+            return None
+        value, expires_at = item
+        if expires_at is not None and expires_at <= time.time():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key, value, expires_at=None):
+        self._data[key] = (value, expires_at)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+
+    def __len__(self):
+        return len(self._data)
+
+
+class ResolutionCache(SQLiteStore):
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS lookups (
+            key TEXT PRIMARY KEY,
+            video_id TEXT NOT NULL,
+            expires_at REAL NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS videos (
+            video_id TEXT PRIMARY KEY,
+            metadata TEXT NOT NULL,
+            expires_at REAL NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS play_counts (
+            video_id TEXT PRIMARY KEY,
+            plays INTEGER NOT NULL
+        );
+    """
+
+    def __init__(self, path=None, max_entries=None, metadata_ttl=None, lookup_ttl=None):
+        super().__init__(path or os.getenv("MUSIC_CACHE_PATH", "cache/music.db"), "music-cache")
+        self.metadata_ttl = metadata_ttl or int(os.getenv("MUSIC_CACHE_METADATA_TTL", 7 * 86400))
+        self.lookup_ttl = lookup_ttl or int(os.getenv("MUSIC_CACHE_LOOKUP_TTL", 30 * 86400))
+        max_entries = max_entries or int(os.getenv("MUSIC_CACHE_MEMORY_ENTRIES", 4096))
+        self.lookups = LRUCache(max_entries)
+        self.videos = LRUCache(max_entries)
+        self.stats = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0}
+
+    def _load(self, lookup_key):
+        conn = self._connect()
+        now = time.time()
+        row = conn.execute("""
+            SELECT videos.metadata, videos.expires_at, lookups.expires_at FROM lookups
+            JOIN videos ON videos.video_id = lookups.video_id
+            WHERE lookups.key = ? AND lookups.expires_at > ? AND videos.expires_at > ?
+        """, (lookup_key, now, now)).fetchone()
+        return row
+
+    def _store(self, lookup_key, metadata, lookup_expires, metadata_expires):
+        conn = self._connect()
+        with conn:
+            conn.execute("INSERT OR REPLACE INTO videos (video_id, metadata, expires_at) VALUES (?, ?, ?)",
+                         (metadata['id'], json.dumps(metadata), metadata_expires))
+            conn.execute("INSERT OR REPLACE INTO lookups (key, video_id, expires_at) VALUES (?, ?, ?)",
+                         (lookup_key, metadata['id'], lookup_expires))
+
+    def _record_play(self, video_id):
+        conn = self._connect()
+        with conn:
+            conn.execute("""
+                INSERT INTO play_counts (video_id, plays) VALUES (?, 1)
+                ON CONFLICT (video_id) DO UPDATE SET plays = plays + 1
+            """, (video_id,))
+        return conn.execute("SELECT plays FROM play_counts WHERE video_id = ?", (video_id,)).fetchone()[0]
+
+    def _purge(self):
+        conn = self._connect()
+        now = time.time()
+        with conn:
+            conn.execute("DELETE FROM lookups WHERE expires_at <= ?", (now,))
+            conn.execute("DELETE FROM videos WHERE expires_at <= ?", (now,))
+
+    @staticmethod
+    def lookup_key(query=None, spotify_id=None):
+        if spotify_id:
+            return f"spotify:{spotify_id}"
+        return f"query:{normalize_query(query)}"
+
+    async def get(self, query=None, spotify_id=None):
+        key = self.lookup_key(query, spotify_id)
+        video_id = self.lookups.get(key)
+        if video_id is not None:
+            metadata = self.videos.get(video_id)
+            if metadata is not None:
+                self.stats['memory_hits'] += 1
+                return dict(metadata)
+
+        try:
+            row = await self._run(self._load, key)
+        except sqlite3.Error as e:
+            # A locked or unreadable cache is a miss; the caller extracts as if it were empty.
+            log.warning("Failed to read the resolution cache: %s", e)
+            row = None
+        if row is None:
+            self.stats['misses'] += 1
+            return None
+
+        metadata_json, metadata_expires, lookup_expires = row
+        metadata = json.loads(metadata_json)
+        self.lookups.set(key, metadata['id'], lookup_expires)
+        self.videos.set(metadata['id'], metadata, metadata_expires)
+        self.stats['disk_hits'] += 1
+        return dict(metadata)
+
+    async def set(self, info, query=None, spotify_id=None):
+        if not info.get('id'):
+            return
+        metadata = {field: info.get(field) for field in METADATA_FIELDS}
+        key = self.lookup_key(query, spotify_id)
+        now = time.time()
+        lookup_expires = now + self.lookup_ttl
+        metadata_expires = now + self.metadata_ttl
+        self.lookups.set(key, metadata['id'], lookup_expires)
+        self.videos.set(metadata['id'], metadata, metadata_expires)
+        try:
+            await self._run(self._store, key, metadata, lookup_expires, metadata_expires)
+        except sqlite3.Error as e:
+            log.warning("Failed to write the resolution cache: %s", e)
+
+    async def record_play(self, video_id):
+        return await self._run(self._record_play, video_id)
+
+    async def purge_expired(self):
+        await self._run(self._purge)
+
+    def hit_rate(self):
+        hits = self.stats['memory_hits'] + self.stats['disk_hits']
+        total = hits + self.stats['misses']
+        return hits / total if total else 0.0
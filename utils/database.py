@@ -1,35 +1,205 @@
+import asyncio
+import logging
 import os
 import asyncpg
 
+from utils.metrics import DB_QUERY_SECONDS
+
+log = logging.getLogger(__name__)
+
+# Hot queries. asyncpg prepares each one on first use and keeps it in the connection's own statement
+# cache, which goes away with the connection when the pool recycles it.
+QUERIES = {
+    'fetch_expired_roles': "SELECT * FROM roles WHERE NOW() > expiration",
+    'fetch_pending_roles': "SELECT user_id, role, guild_id, expiration FROM roles",
+    'delete_role': "DELETE FROM roles WHERE user_id = $1 AND role = $2",
+    # Matched on the guild too: once a role is re-rolled in another guild, the row belongs to that guild.
+    'delete_roles': """
+        DELETE FROM roles USING unnest($1::bigint[], $2::text[], $3::bigint[]) AS expired (user_id, role, guild_id)
+        WHERE roles.user_id = expired.user_id AND roles.role = expired.role
+            AND roles.guild_id IS NOT DISTINCT FROM expired.guild_id
+    """,
+    'assign_role': """
+        INSERT INTO roles (user_id, role, time_assigned, expiration, guild_id) VALUES ($1, $2, NOW(), $3, $4)
+        ON CONFLICT (user_id, role) DO UPDATE
+        SET time_assigned = NOW(), expiration = EXCLUDED.expiration, guild_id = EXCLUDED.guild_id
+    """,
+    'get_messages_for_range': "SELECT message FROM phrases WHERE range_key = $1",
+    # A data-modifying CTE always runs, so the upsert and the phrase read share one round trip.
+    'assign_role_get_messages': """
+        WITH assigned AS (
+            INSERT INTO roles (user_id, role, time_assigned, expiration, guild_id) VALUES ($1, $2, NOW(), $3, $4)
+            ON CONFLICT (user_id, role) DO UPDATE
+            SET time_assigned = NOW(), expiration = EXCLUDED.expiration, guild_id = EXCLUDED.guild_id
+        )
+        SELECT message FROM phrases WHERE range_key = $5
+    """,
+}
+
+# Applied before the pool is created, so statements are never prepared against the old table shape.
+MIGRATIONS = """
+    ALTER TABLE roles ADD COLUMN IF NOT EXISTS guild_id BIGINT;
+"""
+
+# ALTER TABLE needs ownership even when the column is already there, so it only runs when it is missing.
+ROLES_HAVE_GUILD_ID = """
+    SELECT EXISTS (
+        SELECT 1 FROM information_schema.columns
+        WHERE table_name = 'roles' AND column_name = 'guild_id' AND table_schema = current_schema()
+    )
+"""
+
+# The pre-migration roles table, for a database role that may not alter it. Calls pass no guild
+# arguments, and every row reads back with guild_id NULL (looked up in every guild).
+LEGACY_ROLE_QUERIES = {
+    'fetch_pending_roles': "SELECT user_id, role, NULL::bigint AS guild_id, expiration FROM roles",
+    'delete_roles': """
+        DELETE FROM roles WHERE (user_id, role) IN (SELECT * FROM unnest($1::bigint[], $2::text[]))
+    """,
+    'assign_role': """
+        INSERT INTO roles (user_id, role, time_assigned, expiration) VALUES ($1, $2, NOW(), $3)
+        ON CONFLICT (user_id, role) DO UPDATE SET time_assigned = NOW(), expiration = EXCLUDED.expiration
+    """,
+    'assign_role_get_messages': """
+        WITH assigned AS (
+            INSERT INTO roles (user_id, role, time_assigned, expiration) VALUES ($1, $2, NOW(), $3)
+            ON CONFLICT (user_id, role) DO UPDATE SET time_assigned = NOW(), expiration = EXCLUDED.expiration
+        )
+        SELECT message FROM phrases WHERE range_key = $4
+    """,
+}
+
+PHRASES_CHANNEL = "phrases_changed"
+
+PHRASES_TRIGGER = f"""
+    CREATE OR REPLACE FUNCTION notify_phrases_changed() RETURNS trigger AS $$
+    BEGIN
+        PERFORM pg_notify('{PHRASES_CHANNEL}', TG_OP);
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+
+    DROP TRIGGER IF EXISTS phrases_changed ON phrases;
+    CREATE TRIGGER phrases_changed AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON phrases
+        FOR EACH STATEMENT EXECUTE PROCEDURE notify_phrases_changed();
+"""
+
+
 class Database:
-    def __init__(self):
-        self.conn = None
+    def __init__(self, min_size=None, max_size=None, **connect_kwargs):
+        self.pool = None
+        self.listener = None
+        self.min_size = min_size or int(os.environ.get('DB_POOL_MIN_SIZE', 2))
+        self.max_size = max_size or int(os.environ.get('DB_POOL_MAX_SIZE', 10))
+        self.connect_kwargs = connect_kwargs
+        self.queries = QUERIES
+        self.legacy_roles = False
+        self._connect_lock = asyncio.Lock()
+
+    def _connect_params(self):
+        return dict(
+            database=os.environ.get('DB_NAME', 'dulldb'),
+            user=os.environ.get('DB_USER', 'dullfox'),
+            password=os.environ.get('DB_PASSWORD', '1324'),
+            host=os.environ.get('DB_HOST', '130.162.253.235'),
+            **self.connect_kwargs
+        )
 
     async def connect(self):
-        if self.conn is None or self.conn.is_closed():
-            self.conn = await asyncpg.connect(
-                database=os.environ.get('DB_NAME', 'dulldb'),
-                user=os.environ.get('DB_USER', 'dullfox'),
-                password=os.environ.get('DB_PASSWORD', '1324'),
-                host=os.environ.get('DB_HOST', '130.162.253.235')
-            )
+        if self.pool is not None:
+            return
+        async with self._connect_lock:
+            if self.pool is None:
+                conn = await asyncpg.connect(**self._connect_params())
+                try:
+                    await self._migrate(conn)
+                finally:
+                    await conn.close()
+                self.pool = await asyncpg.create_pool(
+                    min_size=self.min_size,
+                    max_size=self.max_size,
+                    **self._connect_params()
+                )
 
-    async def fetch_expired_roles(self):
+    async def _migrate(self, conn):
+        self.legacy_roles = False
+        if not await conn.fetchval(ROLES_HAVE_GUILD_ID):
+            try:
+                await conn.execute(MIGRATIONS)
+            except asyncpg.InsufficientPrivilegeError as e:
+                log.warning("Cannot add roles.guild_id (%s); expired roles will be looked up in every guild", e)
+                self.legacy_roles = True
+        self.queries = dict(QUERIES, **LEGACY_ROLE_QUERIES) if self.legacy_roles else QUERIES
+
+    def _guild_args(self, *args):
+        return () if self.legacy_roles else args
+
+    async def close(self):
+        if self.listener is not None and not self.listener.is_closed():
+            await self.listener.close()
+        if self.pool is not None:
+            await self.pool.close()
+            self.pool = None
+
+    async def _fetch(self, name, *args):
         await self.connect()
-        return await self.conn.fetch("SELECT * FROM roles WHERE NOW() > expiration")
+        with DB_QUERY_SECONDS.time(query=name):
+            return await self.pool.fetch(self.queries[name], *args)
+
+    async def fetch_expired_roles(self):
+        return await self._fetch('fetch_expired_roles')
+
+    async def fetch_pending_roles(self):
+        return await self._fetch('fetch_pending_roles')
 
     async def delete_role(self, user_id, role_name):
+        await self._fetch('delete_role', user_id, role_name)
+
+    async def delete_roles(self, roles):
+        if not roles:
+            return
+        user_ids, role_names, guild_ids = zip(*roles)
+        await self._fetch('delete_roles', list(user_ids), list(role_names), *self._guild_args(list(guild_ids)))
+
+    async def assign_role(self, user_id, role_name, expiration, guild_id=None):
+        await self._fetch('assign_role', user_id, role_name, expiration, *self._guild_args(guild_id))
+
+    async def get_messages_for_range(self, range_key):
+        records = await self._fetch('get_messages_for_range', range_key)
+        return [record['message'] for record in records]
+
+    async def assign_role_and_get_messages(self, user_id, role_name, expiration, guild_id, range_key):
+        records = await self._fetch('assign_role_get_messages', user_id, role_name, expiration,
+                                    *self._guild_args(guild_id), range_key)
+        return [record['message'] for record in records]
+
+    async def get_all_phrases(self):
         await self.connect()
-        await self.conn.execute("DELETE FROM roles WHERE user_id = $1 AND role = $2", user_id, role_name)
+        with DB_QUERY_SECONDS.time(query='get_all_phrases'):
+            records = await self.pool.fetch("SELECT range_key, message FROM phrases")
+        phrases = {}
+        for record in records:
+            phrases.setdefault(record['range_key'], []).append(record['message'])
+        return phrases
 
-    async def assign_role(self, user_id, role_name, expiration):
+    async def get_phrases_version(self):
         await self.connect()
-        await self.conn.execute("""
-            INSERT INTO roles (user_id, role, time_assigned, expiration) VALUES ($1, $2, NOW(), $3)
-            ON CONFLICT (user_id, role) DO UPDATE SET time_assigned = NOW(), expiration = $4
-        """, user_id, role_name, expiration, expiration)
+        with DB_QUERY_SECONDS.time(query='get_phrases_version'):
+            return await self.pool.fetchval("""
+                SELECT count(*) || ':' || coalesce(md5(string_agg(range_key || ':' || message, '|' ORDER BY range_key, message)), '')
+                FROM phrases
+            """)
 
-    async def get_messages_for_range(self, range_key):
+    async def install_phrases_trigger(self):
         await self.connect()
-        records = await self.conn.fetch("SELECT message FROM phrases WHERE range_key = $1", range_key)
-        return [record['message'] for record in records]
\ No newline at end of file
+        async with self.pool.acquire() as conn:
+            async with conn.transaction():
+                await conn.execute(PHRASES_TRIGGER)
+
+    async def listen(self, channel, callback, on_disconnect=None):
+        # LISTEN needs a connection of its own: pooled connections run UNLISTEN * when released.
+        if self.listener is None or self.listener.is_closed():
+            self.listener = await asyncpg.connect(**self._connect_params())
+            if on_disconnect is not None:
+                self.listener.add_termination_listener(lambda conn: on_disconnect())
+        await self.listener.add_listener(channel, callback)
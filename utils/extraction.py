@@ -0,0 +1,190 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from itertools import islice
+
+from utils.metrics import EXTRACTION_INFLIGHT, EXTRACTION_SECONDS
+from utils.music_utils import create_ytdl
+
+log = logging.getLogger(__name__)
+
+_worker_state = threading.local()
+
+
+class ExtractionError(Exception):
+    pass
+
+
+class ExtractionCancelled(ExtractionError):
+    pass
+
+
+class ExtractionTimeout(ExtractionError):
+    pass
+
+
+def _worker_ytdl(profile):
+    # One YoutubeDL per worker thread (or per worker process in process mode), created on first use.
+    instances = getattr(_worker_state, 'instances', None)
+    if instances is None:
+        instances = _worker_state.instances = {}
+    if profile not in instances:
+        instances[profile] = create_ytdl(profile)
+    return instances[profile]
+
+
+def _warm_worker(profile):
+    _worker_ytdl(profile)
+
+
+def _extract(profile, url, ie_key=None):
+    ytdl = _worker_ytdl(profile)
+    info = ytdl.extract_info(url, download=False, ie_key=ie_key)
+    # sanitize_info drops lazy/unpicklable values so results can cross a process boundary.
+    return ytdl.sanitize_info(info)
+
+
+class PlaylistCursor:
+    def __init__(self, ytdl, info):
+        self.ytdl = ytdl
+        self.info = info
+        self.entries = iter(info['entries'])
+        self.lock = threading.Lock()
+
+    def next_page(self, size):
+        with self.lock:
+            return list(islice(self.entries, size))
+
+
+class ExtractionEngine:
+    def __init__(self, mode=None, workers=None, global_limit=None, guild_limit=None, timeout=None):
+        self.mode = mode or os.getenv("EXTRACTION_MODE", "thread")
+        self.workers = workers = workers or int(os.getenv("EXTRACTION_WORKERS", 4))
+        self.timeout = timeout or float(os.getenv("EXTRACTION_TIMEOUT", 60))
+        self.guild_limit = guild_limit or int(os.getenv("EXTRACTION_GUILD_LIMIT", 4))
+        self._global_limit = asyncio.Semaphore(global_limit or int(os.getenv("EXTRACTION_GLOBAL_LIMIT", workers * 2)))
+        # Playlist cursors hold a live generator, so they always stay in this process.
+        self._threads = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ytdl")
+        if self.mode == "process":
+            self._executor = ProcessPoolExecutor(max_workers=workers)
+        else:
+            self._executor = self._threads
+        self._inflight = {}
+        self._waiters = defaultdict(int)
+        self._guild_limits = {}
+        self._guild_futures = defaultdict(set)
+        EXTRACTION_INFLIGHT.set_function(lambda: len(self._inflight))
+
+    async def warm(self):
+        # Every busy worker makes the pool start another, so this builds one YoutubeDL per worker up front
+        # and the first /play doesn't pay for importing yt-dlp.
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*(loop.run_in_executor(self._executor, _warm_worker, 'full') for _ in range(self.workers)))
+
+    def _guild_semaphore(self, guild_id):
+        semaphore = self._guild_limits.get(guild_id)
+        if semaphore is None:
+            semaphore = self._guild_limits[guild_id] = asyncio.Semaphore(self.guild_limit)
+        return semaphore
+
+    async def _run(self, profile, url, ie_key):
+        async with self._global_limit:
+            loop = asyncio.get_running_loop()
+            start = time.perf_counter()
+            outcome = "ok"
+            try:
+                return await loop.run_in_executor(self._executor, _extract, profile, url, ie_key)
+            except asyncio.CancelledError:
+                outcome = "cancelled"
+                raise
+            except Exception:
+                outcome = "error"
+                raise
+            finally:
+                EXTRACTION_SECONDS.observe(time.perf_counter() - start, profile=profile, outcome=outcome)
+
+    def _start(self, key):
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.get_running_loop().create_task(self._run(*key))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None) if self._inflight.get(key) is task else None)
+        return task
+
+    def _release(self, key, task):
+        self._waiters[key] -= 1
+        if self._waiters[key] <= 0:
+            del self._waiters[key]
+            # Nobody is waiting any more; a job still queued in the pool never starts.
+            if not task.done():
+                task.cancel()
+
+    async def extract(self, url, profile='full', guild_id=None, ie_key=None):
+        key = (profile, url, ie_key)
+        async with self._guild_semaphore(guild_id):
+            # Identical requests share one in-flight job (single-flight); each caller gets its own waiter
+            # so one guild's /stop or timeout doesn't cancel the job for the others.
+            task = self._start(key)
+            self._waiters[key] += 1
+            waiter = asyncio.get_running_loop().create_future()
+
+            def copy_result(done):
+                if waiter.done():
+                    return
+                if done.cancelled():
+                    waiter.set_exception(ExtractionCancelled(url))
+                elif done.exception() is not None:
+                    waiter.set_exception(done.exception())
+                else:
+                    waiter.set_result(done.result())
+
+            task.add_done_callback(copy_result)
+            guild_futures = self._guild_futures[guild_id]
+            guild_futures.add(waiter)
+            try:
+                return await asyncio.wait_for(waiter, self.timeout)
+            except asyncio.TimeoutError:
+                raise ExtractionTimeout(url) from None
+            finally:
+                guild_futures.discard(waiter)
+                task.remove_done_callback(copy_result)
+                self._release(key, task)
+
+    async def open_playlist(self, url, guild_id=None):
+        def open_cursor():
+            ytdl = create_ytdl('flat')
+            # process=False keeps 'entries' as the extractor's lazy generator instead of a fully built list.
+            info = ytdl.extract_info(url, download=False, process=False)
+            # Watch URLs with a list= parameter come back as a redirect to the playlist extractor.
+            for _ in range(3):
+                if info is None or info.get('_type') not in ('url', 'url_transparent'):
+                    break
+                info = ytdl.extract_info(info['url'], download=False, ie_key=info.get('ie_key'), process=False)
+            if info is None or 'entries' not in info:
+                return None
+            return PlaylistCursor(ytdl, info)
+
+        async with self._guild_semaphore(guild_id), self._global_limit:
+            loop = asyncio.get_running_loop()
+            return await asyncio.wait_for(loop.run_in_executor(self._threads, open_cursor), self.timeout)
+
+    async def next_page(self, cursor, size):
+        loop = asyncio.get_running_loop()
+        return await asyncio.wait_for(loop.run_in_executor(self._threads, cursor.next_page, size), self.timeout)
+
+    def cancel_guild(self, guild_id):
+        for waiter in list(self._guild_futures.pop(guild_id, ())):
+            if not waiter.done():
+                waiter.set_exception(ExtractionCancelled(f"guild {guild_id}"))
+        self._guild_limits.pop(guild_id, None)
+
+    def shutdown(self):
+        for task in self._inflight.values():
+            task.cancel()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        if self._executor is not self._threads:
+            self._threads.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,31 @@
+import asyncio
+
+
+class IdleManager:
+    def __init__(self, on_idle, timeout):
+        # on_idle(guild_id, reason) is awaited once the guild's deadline passes.
+        self.on_idle = on_idle
+        self.timeout = timeout
+        self._handles = {}
+
+    def arm(self, guild_id, reason="idle", delay=None):
+        self.cancel(guild_id)
+        loop = asyncio.get_running_loop()
+        self._handles[guild_id] = loop.call_later(self.timeout if delay is None else delay, self._fire, guild_id, reason)
+
+    def cancel(self, guild_id):
+        handle = self._handles.pop(guild_id, None)
+        if handle is not None:
+            handle.cancel()
+
+    def is_armed(self, guild_id):
+        return guild_id in self._handles
+
+    def _fire(self, guild_id, reason):
+        self._handles.pop(guild_id, None)
+        asyncio.get_running_loop().create_task(self.on_idle(guild_id, reason))
+
+    def clear(self):
+        for handle in self._handles.values():
+            handle.cancel()
+        self._handles.clear()
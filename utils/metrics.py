@@ -0,0 +1,237 @@
+import logging
+import os
+import time
+from contextlib import contextmanager
+
+from aiohttp import web
+
+log = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+def command_budgets(spec=None):
+    # "command=seconds" pairs; a command without a budget is never logged as slow.
+    spec = spec if spec is not None else os.getenv("SLOW_COMMAND_BUDGETS", "play=5,queue=0.5,tyd=1")
+    budgets = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        name, _, seconds = item.partition("=")
+        budgets[name.strip()] = float(seconds)
+    return budgets
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    pairs.extend(f'{name}="{_escape(value)}"' for name, value in extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    def header(self):
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._values = {}
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def collect(self):
+        lines = self.header()
+        for key, value in self._values.items():
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def __init__(self, name, documentation, labelnames=(), callback=None):
+        super().__init__(name, documentation, labelnames)
+        self._values = {}
+        # callback() -> value, or an iterable of (label values tuple, value); evaluated at scrape time.
+        self.callback = callback
+
+    def set(self, value, **labels):
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        self._values[key] = value
+
+    def set_function(self, callback):
+        self.callback = callback
+
+    def collect(self):
+        lines = self.header()
+        if self.callback is not None:
+            try:
+                result = self.callback()
+            except Exception as e:
+                log.warning("Metric callback for %s failed: %s", self.name, e)
+                return lines
+            samples = result if self.labelnames else [((), result)]
+        else:
+            samples = self._values.items()
+        for key, value in samples:
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets) + (float('inf'),)
+        self._values = {}
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        series = self._values.get(key)
+        if series is None:
+            series = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+        counts = series[0]
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                counts[index] += 1
+                break
+        series[1] += value
+        series[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield labels
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def collect(self):
+        lines = self.header()
+        for key, (counts, total, count) in self._values.items():
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.labelnames, key, [('le', _format_value(bound))])
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+
+    def register(self, metric):
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.collect())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+EXTRACTION_SECONDS = REGISTRY.register(Histogram(
+    "bot_extraction_seconds", "yt-dlp extraction latency", ("profile", "outcome")))
+EXTRACTION_INFLIGHT = REGISTRY.register(Gauge(
+    "bot_extraction_inflight", "Extractions currently queued or running"))
+SPOTIFY_REQUEST_SECONDS = REGISTRY.register(Histogram(
+    "bot_spotify_request_seconds", "Spotify Web API request latency", ("endpoint", "status")))
+DB_QUERY_SECONDS = REGISTRY.register(Histogram(
+    "bot_db_query_seconds", "PostgreSQL query round-trip time", ("query",)))
+COMMAND_SECONDS = REGISTRY.register(Histogram(
+    "bot_command_seconds", "Slash command handling time", ("command", "outcome")))
+QUEUE_LENGTH = REGISTRY.register(Gauge(
+    "bot_queue_length", "Tracks waiting in each guild queue", ("guild",)))
+VOICE_CLIENTS = REGISTRY.register(Gauge(
+    "bot_voice_clients", "Connected voice clients"))
+FFMPEG_PROCESSES = REGISTRY.register(Gauge(
+    "bot_ffmpeg_processes", "Live FFmpeg processes (playing and prefetched)"))
+CACHE_LOOKUPS = REGISTRY.register(Gauge(
+    "bot_resolution_cache_lookups", "Resolution cache lookups by result", ("result",)))
+CACHE_HIT_RATIO = REGISTRY.register(Gauge(
+    "bot_resolution_cache_hit_ratio", "Share of resolution cache lookups served from cache"))
+AUDIO_CACHE_BYTES = REGISTRY.register(Gauge(
+    "bot_audio_cache_bytes", "Bytes used by the local Opus cache"))
+STARTUP_SECONDS = REGISTRY.register(Gauge(
+    "bot_startup_seconds", "Seconds from process start to each startup milestone, or the duration of a warm-up step",
+    ("stage",)))
+
+
+def instrument_commands(bot, budgets=None):
+    budgets = command_budgets() if budgets is None else budgets
+
+    def command_name(ctx):
+        return ctx.command.qualified_name if ctx.command else "unknown"
+
+    async def on_application_command(ctx):
+        ctx.metrics_started = time.perf_counter()
+
+    def finish(ctx, outcome):
+        started = getattr(ctx, 'metrics_started', None)
+        if started is None:
+            return
+        elapsed = time.perf_counter() - started
+        name = command_name(ctx)
+        COMMAND_SECONDS.observe(elapsed, command=name, outcome=outcome)
+        budget = budgets.get(name)
+        if budget is not None and elapsed > budget:
+            options = {option['name']: option.get('value') for option in (ctx.selected_options or ())}
+            log.warning("Slow /%s: %.3fs over a %.3fs budget (outcome=%s, guild=%s, options=%s)",
+                        name, elapsed, budget, outcome, ctx.guild_id, options)
+
+    async def on_application_command_completion(ctx):
+        finish(ctx, "ok")
+
+    async def on_application_command_error(ctx, error):
+        finish(ctx, "error")
+
+    bot.add_listener(on_application_command)
+    bot.add_listener(on_application_command_completion)
+    bot.add_listener(on_application_command_error)
+
+
+async def start_metrics_server(host=None, port=None):
+    host = host or os.getenv("METRICS_HOST", "127.0.0.1")
+    port = int(port if port is not None else os.getenv("METRICS_PORT", 9100))
+    if not port:
+        return None
+
+    async def handle_metrics(request):
+        return web.Response(body=REGISTRY.render().encode(),
+                            headers={'Content-Type': "text/plain; version=0.0.4; charset=utf-8"})
+
+    app = web.Application()
+    app.router.add_get("/metrics", handle_metrics)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    log.info("Serving metrics on http://%s:%d/metrics", host, port)
+    return runner
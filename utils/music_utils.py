@@ -1,22 +1,48 @@
-import yt_dlp
-import spotipy
 import os
-from spotipy.oauth2 import SpotifyClientCredentials
 
-# yt_dlp setup
-yt_dlp.utils.bug_reports_message = lambda: ''
+from utils.spotify import SpotifyClient
+
+AUDIO_CACHE_DIR = os.getenv("AUDIO_CACHE_DIR", "downloads")
+
 ytdl_format_options = {
     'format': 'bestaudio/best',
+    'socket_timeout': 15,
+}
+
+# Playlist listing: IDs and titles only, formats are resolved when a track is about to play
+ytdl_flat_options = {
+    'extract_flat': 'in_playlist',
+    'lazy_playlist': True,
+    'socket_timeout': 15,
+}
+
+# Local audio cache downloads: prefer the Opus stream so the extract step is a remux, not a transcode
+ytdl_cache_options = {
+    'format': 'bestaudio[acodec=opus]/bestaudio/best',
     'postprocessors': [{
         'key': 'FFmpegExtractAudio',
-        'preferredcodec': 'mp3',
-        'preferredquality': '192',
+        'preferredcodec': 'opus',
     }],
-    'outtmpl': 'downloads/%(id)s.%(ext)s',
-    'keepvideo': False
+    'outtmpl': os.path.join(AUDIO_CACHE_DIR, 'tmp', '%(id)s.%(ext)s'),
+    'keepvideo': False,
+    'socket_timeout': 15,
 }
-ytdl = yt_dlp.YoutubeDL(ytdl_format_options)
+
+YTDL_PROFILES = {
+    'full': ytdl_format_options,
+    'flat': ytdl_flat_options,
+    'cache': ytdl_cache_options,
+}
+
+
+def create_ytdl(profile='full'):
+    # Imported on first use: yt-dlp is the slowest import in the bot and nothing needs it before the first /play
+    # (or the warm-up in Music.on_ready).
+    import yt_dlp
+    yt_dlp.utils.bug_reports_message = lambda: ''
+    # YoutubeDL instances aren't thread-safe; every extraction worker builds its own.
+    return yt_dlp.YoutubeDL(YTDL_PROFILES[profile])
+
 
 # Spotify client setup
-sp = spotipy.Spotify(auth_manager=SpotifyClientCredentials(client_id=os.getenv("SPOTIFY_CLIENT_ID"),
-                                                           client_secret=os.getenv("SPOTIFY_CLIENT_SECRET")))
\ No newline at end of file
+spotify = SpotifyClient()
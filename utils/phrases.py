@@ -0,0 +1,64 @@
+import asyncio
+import logging
+import random
+
+from utils.database import PHRASES_CHANNEL
+
+log = logging.getLogger(__name__)
+
+
+class PhraseCache:
+    def __init__(self, db):
+        self.db = db
+        self.phrases = {}
+        self.version = None
+        self.loaded = False
+        self.listening = False
+        self._dirty = False
+        self._reload_task = None
+
+    async def load(self):
+        phrases = await self.db.get_all_phrases()
+        version = await self.db.get_phrases_version()
+        self.phrases = phrases
+        self.version = version
+        self.loaded = True
+        log.info("Loaded %d phrases for %d ranges", sum(map(len, phrases.values())), len(phrases))
+
+    async def listen(self):
+        try:
+            await self.db.install_phrases_trigger()
+            await self.db.listen(PHRASES_CHANNEL, self._on_notify, on_disconnect=self._on_disconnect)
+        except Exception as e:
+            log.warning("Phrase change notifications unavailable, falling back to version checks: %s", e)
+            self.listening = False
+            return
+        self.listening = True
+
+    async def refresh_if_changed(self):
+        if await self.db.get_phrases_version() != self.version:
+            await self.load()
+
+    def _on_notify(self, connection, pid, channel, payload):
+        # Notifications that arrive during a reload trigger one more pass instead of a reload each.
+        self._dirty = True
+        if self._reload_task is None or self._reload_task.done():
+            self._reload_task = asyncio.get_running_loop().create_task(self._reload())
+
+    async def _reload(self):
+        while self._dirty:
+            self._dirty = False
+            try:
+                await self.load()
+            except Exception as e:
+                log.warning("Failed to reload phrases: %s", e)
+                return
+
+    def _on_disconnect(self):
+        self.listening = False
+
+    def choice(self, range_key):
+        messages = self.phrases.get(range_key)
+        if not messages:
+            return None
+        return random.choice(messages)
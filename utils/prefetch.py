@@ -0,0 +1,118 @@
+import asyncio
+import time
+from urllib.parse import parse_qs, urlparse
+
+DEFAULT_STREAM_TTL = 3600
+EXPIRY_MARGIN = 60
+
+
+def stream_url_expiry(url, default_ttl=DEFAULT_STREAM_TTL):
+    # googlevideo URLs carry their expiry as a unix timestamp in the 'expire' query parameter.
+    expire = parse_qs(urlparse(url).query).get('expire')
+    if expire and expire[0].isdigit():
+        return int(expire[0])
+    return time.time() + default_ttl
+
+
+def is_stream_fresh(url, margin=EXPIRY_MARGIN):
+    return bool(url) and stream_url_expiry(url) - margin > time.time()
+
+
+def track_key(track):
+    return track.webpage_url or track.id
+
+
+class PrefetchedStream:
+    def __init__(self):
+        self.task = None
+        self.track = None
+        self.expires_at = 0
+        self.source = None
+        self.spawn_handle = None
+
+    def is_fresh(self):
+        return self.track is not None and self.expires_at - EXPIRY_MARGIN > time.time()
+
+    def discard(self):
+        self.task.cancel()
+        if self.spawn_handle:
+            self.spawn_handle.cancel()
+        if self.source:
+            self.source.cleanup()
+            self.source = None
+
+
+class StreamPrefetcher:
+    def __init__(self, resolve, create_source, depth=2, spawn_lead=15):
+        self.resolve = resolve
+        self.create_source = create_source
+        self.depth = depth
+        self.spawn_lead = spawn_lead
+        self.guilds = {}
+
+    def schedule(self, guild_id, upcoming, current_duration=None):
+        loop = asyncio.get_running_loop()
+        entries = self.guilds.setdefault(guild_id, {})
+        wanted = [track for track in upcoming[:self.depth] if track_key(track)]
+        wanted_keys = {track_key(track) for track in wanted}
+
+        for key in list(entries):
+            if key not in wanted_keys:
+                entries.pop(key).discard()
+
+        for track in wanted:
+            key = track_key(track)
+            if key not in entries:
+                # The result lands on the entry itself, which take() may already have popped off the guild.
+                entry = entries[key] = PrefetchedStream()
+                entry.task = loop.create_task(self._resolve(guild_id, entry, track))
+
+        # Only the very next track gets an FFmpeg process, spawned shortly before the current one ends
+        # so the idle process doesn't hold a stream connection open for the whole song.
+        if wanted and current_duration:
+            entry = entries[track_key(wanted[0])]
+            if entry.source is None and entry.spawn_handle is None:
+                delay = max(0, current_duration - self.spawn_lead)
+                entry.spawn_handle = loop.call_later(delay, self._spawn, entry)
+
+    async def _resolve(self, guild_id, entry, track):
+        resolved = await self.resolve(track, guild_id)
+        if resolved is None or not resolved.stream_url:
+            return
+        entry.track = resolved
+        entry.expires_at = stream_url_expiry(resolved.stream_url)
+
+    def _spawn(self, entry):
+        entry.spawn_handle = None
+        if entry.task.done() and entry.is_fresh() and entry.source is None:
+            entry.source = self.create_source(entry.track)
+        elif not entry.task.done():
+            entry.task.add_done_callback(lambda _: self._spawn(entry) if entry.is_fresh() else None)
+
+    async def take(self, guild_id, track):
+        entry = self.guilds.get(guild_id, {}).pop(track_key(track), None)
+        if entry is None:
+            return None, None
+        if entry.spawn_handle:
+            entry.spawn_handle.cancel()
+            entry.spawn_handle = None
+        try:
+            await asyncio.shield(entry.task)
+        except asyncio.CancelledError:
+            entry.discard()
+            raise
+        except Exception:
+            entry.discard()
+            return None, None
+        if not entry.is_fresh():
+            entry.discard()
+            return None, None
+        source, entry.source = entry.source, None
+        return entry.track, source
+
+    def source_count(self):
+        return sum(entry.source is not None for entries in self.guilds.values() for entry in entries.values())
+
+    def clear(self, guild_id):
+        for entry in self.guilds.pop(guild_id, {}).values():
+            entry.discard()
@@ -0,0 +1,196 @@
+import asyncio
+import cProfile
+import logging
+import marshal
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+log = logging.getLogger(__name__)
+
+STALL_THRESHOLD = float(os.getenv("LOOP_STALL_THRESHOLD_MS", 100)) / 1000
+SAMPLE_INTERVAL = float(os.getenv("PROFILER_SAMPLE_INTERVAL_MS", 5)) / 1000
+STACK_DEPTH = 64
+# Leaf frames of an event loop with nothing to do; left out of the "busiest" summary.
+IDLE_FRAMES = ("selectors.py:", "threading.py:Condition.wait", "queue.py:Queue.get")
+
+
+def frame_name(frame):
+    code = frame.f_code
+    return f"{os.path.basename(code.co_filename)}:{code.co_qualname}"
+
+
+def collapse(frame, thread_name):
+    # Brendan Gregg's collapsed format, root first: "thread;outer;...;leaf".
+    names = []
+    while frame is not None and len(names) < STACK_DEPTH:
+        names.append(frame_name(frame))
+        frame = frame.f_back
+    names.append(str(thread_name).replace(";", ":"))
+    return ";".join(reversed(names))
+
+
+def format_stack(frame, limit=12):
+    lines = []
+    while frame is not None and len(lines) < limit:
+        lines.append(f"  {frame.f_code.co_filename}:{frame.f_lineno} in {frame.f_code.co_qualname}")
+        frame = frame.f_back
+    return "\n".join(reversed(lines))
+
+
+def describe_task(task):
+    if task is None:
+        return "a loop callback outside any task"
+    coro = task.get_coro()
+    return f"{getattr(coro, '__qualname__', coro)} ({task.get_name()})"
+
+
+class StackSampler:
+    # Wall-clock sampling of every thread from a background thread, so time spent blocked in the
+    # yt-dlp, SQLite or Spotify workers shows up next to what the event loop itself was doing.
+    def __init__(self, interval=SAMPLE_INTERVAL):
+        self.interval = interval
+        self.stacks = Counter()
+        self.loop_leaves = Counter()
+        self.samples = 0
+        self._loop_thread = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        # Called on the event loop thread.
+        self._loop_thread = threading.get_ident()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                self.stacks[collapse(frame, names.get(ident, ident))] += 1
+                if ident == self._loop_thread:
+                    self.loop_leaves[frame_name(frame)] += 1
+            self.samples += 1
+
+    def report(self):
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common()).encode()
+
+    def top(self, count=5):
+        busy = [(name, hits) for name, hits in self.loop_leaves.most_common()
+                if not name.startswith(IDLE_FRAMES)]
+        return [f"{hits / self.samples:.0%} {name}" for name, hits in busy[:count]] if self.samples else []
+
+
+class FunctionProfiler:
+    # Deterministic cProfile of the event loop thread; the report loads with pstats.Stats or snakeviz.
+    def __init__(self):
+        self.profiler = cProfile.Profile()
+        self.stats = None
+
+    def start(self):
+        self.profiler.enable()
+
+    def stop(self):
+        self.profiler.disable()
+        self.profiler.create_stats()
+        self.stats = self.profiler.stats
+
+    def report(self):
+        # The same bytes pstats.Stats.dump_stats writes.
+        return marshal.dumps(self.stats)
+
+    def top(self, count=5):
+        ordered = sorted(((key, value) for key, value in self.stats.items() if "of 'select." not in key[2]),
+                         key=lambda item: item[1][2], reverse=True)
+        return [f"{tottime:.3f}s {os.path.basename(filename)}:{function}"
+                for (filename, _, function), (_, _, tottime, _, _) in ordered[:count]]
+
+
+class LoopLagMonitor:
+    # A heartbeat on the loop measures how late it wakes up; a watchdog thread catches the loop while
+    # it is still stuck and records the running task and its stack, which are gone once it recovers.
+    def __init__(self, loop, threshold=STALL_THRESHOLD):
+        self.loop = loop
+        self.threshold = threshold
+        self.interval = threshold / 2
+        self.stalls = []
+        self._beat = None
+        self._captured = None
+        self._loop_thread = None
+        self._heartbeat_task = None
+        self._stop = threading.Event()
+        self._watchdog = None
+
+    def start(self):
+        # Called on the event loop thread.
+        self._loop_thread = threading.get_ident()
+        self._beat = time.monotonic()
+        self._heartbeat_task = self.loop.create_task(self._heartbeat())
+        self._watchdog = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._watchdog.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._heartbeat_task is not None:
+            self._heartbeat_task.cancel()
+        if self._watchdog is not None:
+            self._watchdog.join()
+
+    async def _heartbeat(self):
+        while True:
+            beat = self._beat = time.monotonic()
+            await asyncio.sleep(self.interval)
+            lag = time.monotonic() - beat - self.interval
+            if lag >= self.threshold:
+                captured = self._captured
+                if captured is not None and captured[0] == beat:
+                    _, where, stack = captured
+                else:
+                    where, stack = "unknown (over before the watchdog looked)", ""
+                self.stalls.append((lag, where))
+                log.warning("Event loop stalled for %.0f ms in %s\n%s", lag * 1000, where, stack)
+
+    def _watch(self):
+        while not self._stop.wait(self.threshold / 4):
+            beat = self._beat
+            if self._captured is not None and self._captured[0] == beat:
+                continue
+            if time.monotonic() - beat - self.interval < self.threshold:
+                continue
+            frame = sys._current_frames().get(self._loop_thread)
+            task = asyncio.current_task(self.loop)
+            self._captured = (beat, describe_task(task), format_stack(frame) if frame else "")
+
+    def worst(self, count=3):
+        return [f"{lag * 1000:.0f} ms in {where}" for lag, where in sorted(self.stalls, reverse=True)[:count]]
+
+
+class ProfileSession:
+    FORMATS = {'collapsed': (StackSampler, "txt"), 'pstats': (FunctionProfiler, "pstats")}
+
+    def __init__(self, loop, report_format="collapsed", threshold=STALL_THRESHOLD):
+        profiler_class, self.extension = self.FORMATS[report_format]
+        self.profiler = profiler_class()
+        self.monitor = LoopLagMonitor(loop, threshold)
+
+    async def run(self, seconds):
+        self.monitor.start()
+        self.profiler.start()
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            self.profiler.stop()
+            self.monitor.stop()
+
+    def report(self):
+        return self.profiler.report()
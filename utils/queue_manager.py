@@ -0,0 +1,94 @@
+from collections import deque
+from itertools import islice
+
+
+class Track:
+    __slots__ = ('id', 'title', 'webpage_url', 'duration', 'requester', 'stream_url', 'stream_codec')
+
+    def __init__(self, id, title, webpage_url, duration=None, requester=None, stream_url=None, stream_codec=None):
+        self.id = id
+        self.title = title
+        self.webpage_url = webpage_url
+        self.duration = duration
+        self.requester = requester
+        self.stream_url = stream_url
+        self.stream_codec = stream_codec
+
+    @classmethod
+    def from_info(cls, info, requester=None):
+        # Flat playlist entries ('_type': 'url') carry the watch page in 'url'; resolved entries carry the stream.
+        if info.get('_type') == 'url':
+            webpage_url = info.get('webpage_url') or info.get('url')
+            stream_url = stream_codec = None
+        else:
+            webpage_url = info.get('webpage_url')
+            stream_url = info.get('url')
+            stream_codec = info.get('acodec')
+        return cls(
+            id=info.get('id'),
+            title=info.get('title') or 'Неизвестно',
+            webpage_url=webpage_url,
+            duration=info.get('duration'),
+            requester=requester,
+            stream_url=stream_url,
+            stream_codec=stream_codec,
+        )
+
+    def with_stream(self, stream_url, duration=None, codec=None):
+        return Track(self.id, self.title, self.webpage_url, duration or self.duration, self.requester, stream_url, codec)
+
+    def to_record(self):
+        # Stream URLs expire within hours, so a saved track is resolved again when it comes up.
+        return [self.id, self.title, self.webpage_url, self.duration, self.requester]
+
+    @classmethod
+    def from_record(cls, record):
+        return cls(*record)
+
+    def __repr__(self):
+        return f"<Track id={self.id!r} title={self.title!r}>"
+
+
+class GuildQueue:
+    __slots__ = ('_tracks', 'on_change')
+
+    def __init__(self, tracks=(), on_change=None):
+        self._tracks = deque(tracks)
+        # Called after every mutation (the queue store marks the guild for its next snapshot).
+        self.on_change = on_change
+
+    def _changed(self):
+        if self.on_change is not None:
+            self.on_change()
+
+    def append(self, track):
+        self._tracks.append(track)
+        self._changed()
+
+    def extend(self, tracks):
+        self._tracks.extend(tracks)
+        self._changed()
+
+    def popleft(self):
+        track = self._tracks.popleft()
+        self._changed()
+        return track
+
+    def peek(self, count=1):
+        return list(islice(self._tracks, count))
+
+    def slice(self, start, stop):
+        return list(islice(self._tracks, start, stop))
+
+    def clear(self):
+        self._tracks.clear()
+        self._changed()
+
+    def __len__(self):
+        return len(self._tracks)
+
+    def __bool__(self):
+        return bool(self._tracks)
+
+    def __iter__(self):
+        return iter(self._tracks)
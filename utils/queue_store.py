@@ -0,0 +1,131 @@
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import time
+
+from utils.sqlite_store import SQLiteStore
+
+log = logging.getLogger(__name__)
+
+
+class QueueStore(SQLiteStore):
+    # Write-behind snapshots of each guild's queue, so a restart picks up where playback stopped.
+    # Mutations only mark the guild dirty; one batched transaction per interval writes them out.
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS guild_queues (
+            guild_id INTEGER PRIMARY KEY,
+            text_channel_id INTEGER NOT NULL,
+            voice_channel_id INTEGER NOT NULL,
+            current TEXT,
+            position REAL NOT NULL DEFAULT 0,
+            tracks TEXT NOT NULL,
+            saved_at REAL NOT NULL
+        );
+    """
+
+    def __init__(self, snapshot, paused=None, path=None, interval=None, max_age=None):
+        super().__init__(path or os.getenv("QUEUE_STATE_PATH", "cache/queues.db"), "queue-store")
+        # snapshot(guild_id) -> dict describing the guild's queue, or None once there is nothing to keep.
+        self.snapshot = snapshot
+        # paused() -> True while nothing may be written, e.g. during shutdown, when voice clients are torn
+        # down and every queue looks released.
+        self.paused = paused
+        self.interval = interval or float(os.getenv("QUEUE_SNAPSHOT_INTERVAL", 5))
+        self.max_age = max_age or int(os.getenv("QUEUE_RESTORE_MAX_AGE", 86400))
+        self._dirty = set()
+        self._flush_task = None
+
+    def _write(self, snapshots):
+        conn = self._connect()
+        now = time.time()
+        with conn:
+            for guild_id, snapshot in snapshots:
+                if snapshot is None:
+                    conn.execute("DELETE FROM guild_queues WHERE guild_id = ?", (guild_id,))
+                    continue
+                conn.execute("""
+                    INSERT OR REPLACE INTO guild_queues
+                        (guild_id, text_channel_id, voice_channel_id, current, position, tracks, saved_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                """, (guild_id, snapshot['text_channel_id'], snapshot['voice_channel_id'],
+                      json.dumps(snapshot['current']) if snapshot['current'] else None,
+                      snapshot['position'], json.dumps(snapshot['tracks']), now))
+
+    def _write_positions(self, positions):
+        conn = self._connect()
+        now = time.time()
+        with conn:
+            conn.executemany("UPDATE guild_queues SET position = ?, saved_at = ? WHERE guild_id = ?",
+                             [(position, now, guild_id) for guild_id, position in positions.items()])
+
+    def _saved_guilds(self):
+        conn = self._connect()
+        with conn:
+            conn.execute("DELETE FROM guild_queues WHERE saved_at <= ?", (time.time() - self.max_age,))
+        return [guild_id for guild_id, in conn.execute("SELECT guild_id FROM guild_queues")]
+
+    def _load(self, guild_id):
+        row = self._connect().execute("""
+            SELECT text_channel_id, voice_channel_id, current, position, tracks FROM guild_queues
+            WHERE guild_id = ?
+        """, (guild_id,)).fetchone()
+        if row is None:
+            return None
+        text_channel_id, voice_channel_id, current, position, tracks = row
+        return {
+            'text_channel_id': text_channel_id,
+            'voice_channel_id': voice_channel_id,
+            'current': json.loads(current) if current else None,
+            'position': position,
+            'tracks': json.loads(tracks),
+        }
+
+    def is_paused(self):
+        return self.paused is not None and self.paused()
+
+    def mark_dirty(self, guild_id):
+        if self.is_paused():
+            return
+        self._dirty.add(guild_id)
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.get_running_loop().create_task(self._flush_later())
+
+    async def _flush_later(self):
+        # Guilds marked while a batch is being written go out with the next one.
+        while self._dirty and not self.is_paused():
+            await asyncio.sleep(self.interval)
+            await self.flush()
+
+    async def flush(self):
+        if not self._dirty or self.is_paused():
+            return
+        dirty, self._dirty = self._dirty, set()
+        # Snapshots are taken on the loop, where the queues live; only the encoding and I/O leave it.
+        snapshots = [(guild_id, self.snapshot(guild_id)) for guild_id in dirty]
+        try:
+            await self._run(self._write, snapshots)
+        except sqlite3.Error as e:
+            log.warning("Failed to save queue snapshots: %s", e)
+            self._dirty |= dirty
+
+    async def save_positions(self, positions):
+        # Playback position moves without touching the queue; it is refreshed on its own, row by row.
+        if positions:
+            await self._run(self._write_positions, positions)
+
+    async def saved_guilds(self):
+        return await self._run(self._saved_guilds)
+
+    async def load(self, guild_id):
+        return await self._run(self._load, guild_id)
+
+    def close(self):
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+        snapshots = [] if self.is_paused() else [(guild_id, self.snapshot(guild_id)) for guild_id in self._dirty]
+        self._dirty = set()
+        if snapshots:
+            self._executor.submit(self._write, snapshots)
+        super().close()
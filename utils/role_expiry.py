@@ -0,0 +1,132 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import os
+from datetime import datetime, timedelta
+
+log = logging.getLogger(__name__)
+
+RETRY_DELAY = timedelta(minutes=5)
+
+
+class RoleExpiryScheduler:
+    def __init__(self, db, remove_role, clock=datetime.now, batch_window=None, guild_concurrency=None, owns_guild=None):
+        self.db = db
+        # remove_role(guild_id, user_id, role_name) -> True once the role is gone, False to retry later,
+        # None when it is not this process's to remove (the row is kept for the process that can).
+        self.remove_role = remove_role
+        # owns_guild(guild_id) -> False for guilds another cluster process expires roles for.
+        self.owns_guild = owns_guild
+        self.clock = clock
+        self.batch_window = batch_window or timedelta(seconds=int(os.getenv("ROLE_EXPIRY_BATCH_WINDOW", 5)))
+        self._guild_limit = asyncio.Semaphore(guild_concurrency or int(os.getenv("ROLE_EXPIRY_GUILD_CONCURRENCY", 5)))
+        self._heap = []
+        self._counter = itertools.count()
+        # Latest expiration per (user_id, role, guild_id); heap entries that don't match it are stale re-assignments.
+        self._pending = {}
+        # The guild each (user_id, role) row in the roles table currently points at.
+        self._assigned = {}
+        self._wakeup = asyncio.Event()
+        self._task = None
+
+    async def start(self):
+        for record in await self.db.fetch_pending_roles():
+            if self.owns_guild is not None and not self.owns_guild(record['guild_id']):
+                continue
+            self._assigned[(record['user_id'], record['role'])] = record['guild_id']
+            self._push(record['user_id'], record['role'], record['guild_id'], record['expiration'])
+        log.info("Loaded %d pending role expirations", len(self._pending))
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+
+    def schedule(self, user_id, role_name, guild_id, expiration):
+        previous_guild = self._assigned.get((user_id, role_name), guild_id)
+        self._assigned[(user_id, role_name)] = guild_id
+        if previous_guild != guild_id and (user_id, role_name, previous_guild) in self._pending:
+            # The cooldown is per user, so the same role can be rolled in another guild. The roles table
+            # keeps one row per (user, role), now pointing at the new guild; the role in the previous
+            # guild would be forgotten on the next restart, so it expires right away.
+            self._push(user_id, role_name, previous_guild, self.clock())
+        self._push(user_id, role_name, guild_id, expiration)
+        self._wakeup.set()
+
+    def _push(self, user_id, role_name, guild_id, expiration):
+        if expiration.tzinfo is not None:
+            # Expirations are written as naive local time; a timestamptz column hands them back aware.
+            expiration = expiration.astimezone().replace(tzinfo=None)
+        self._pending[(user_id, role_name, guild_id)] = expiration
+        heapq.heappush(self._heap, (expiration, next(self._counter), user_id, role_name, guild_id))
+
+    def __len__(self):
+        return len(self._pending)
+
+    def pop_due(self):
+        # Everything due within the batch window goes out together, so a burst of /tyd rolls becomes one batch.
+        cutoff = self.clock() + self.batch_window
+        due = []
+        while self._heap and self._heap[0][0] <= cutoff:
+            expiration, _, user_id, role_name, guild_id = heapq.heappop(self._heap)
+            if self._pending.get((user_id, role_name, guild_id)) != expiration:
+                continue
+            del self._pending[(user_id, role_name, guild_id)]
+            due.append((user_id, role_name, guild_id))
+        return due
+
+    async def _run(self):
+        while True:
+            self._wakeup.clear()
+            if not self._heap:
+                await self._wakeup.wait()
+                continue
+
+            delay = (self._heap[0][0] - self.clock()).total_seconds()
+            if delay > 0:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            try:
+                await self.expire(self.pop_due())
+            except Exception as e:
+                log.exception("Failed to expire roles: %s", e)
+
+    async def expire(self, due):
+        if not due:
+            return
+        by_guild = {}
+        for user_id, role_name, guild_id in due:
+            by_guild.setdefault(guild_id, []).append((user_id, role_name))
+
+        results = await asyncio.gather(*(self._expire_guild(guild_id, roles) for guild_id, roles in by_guild.items()))
+        removed = [role for guild_removed in results for role in guild_removed]
+        await self.db.delete_roles(removed)
+        log.info("Expired %d roles across %d guilds", len(removed), len(by_guild))
+
+    async def _expire_guild(self, guild_id, roles):
+        removed = []
+        # Sequential within a guild: role edits share one per-guild rate limit bucket.
+        async with self._guild_limit:
+            for user_id, role_name in roles:
+                try:
+                    done = await self.remove_role(guild_id, user_id, role_name)
+                except Exception as e:
+                    log.warning("Failed to remove role %s from %s in guild %s: %s", role_name, user_id, guild_id, e)
+                    done = False
+                if done is None:
+                    continue
+                if done:
+                    # A role re-rolled in another guild has no row of its own left to delete (the legacy
+                    # table can't tell the guilds apart, so deleting would drop the new guild's row).
+                    if self._assigned.get((user_id, role_name), guild_id) == guild_id:
+                        removed.append((user_id, role_name, guild_id))
+                        self._assigned.pop((user_id, role_name), None)
+                elif (user_id, role_name, guild_id) not in self._pending:
+                    self._push(user_id, role_name, guild_id, self.clock() + RETRY_DELAY)
+        return removed
@@ -0,0 +1,17 @@
+class RoleIndex:
+    def __init__(self):
+        # guild_id -> {role name: role id}, built on first use and dropped on any role change in the guild.
+        self._guilds = {}
+
+    def get(self, guild, name):
+        index = self._guilds.get(guild.id)
+        if index is None:
+            index = self._guilds[guild.id] = {}
+            # guild.roles sorts on every access; first match wins, like discord.utils.get over the same list.
+            for role in guild.roles:
+                index.setdefault(role.name, role.id)
+        role_id = index.get(name)
+        return guild.get_role(role_id) if role_id is not None else None
+
+    def invalidate(self, guild_id):
+        self._guilds.pop(guild_id, None)
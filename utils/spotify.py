@@ -0,0 +1,124 @@
+import asyncio
+import logging
+import os
+import re
+import time
+
+import aiohttp
+
+from utils.metrics import SPOTIFY_REQUEST_SECONDS
+
+log = logging.getLogger(__name__)
+
+SPOTIFY_URL_RE = re.compile(r"open\.spotify\.com/(?:intl-[\w-]+/)?(track|album|playlist)/([A-Za-z0-9]+)")
+
+
+class SpotifyError(Exception):
+    pass
+
+
+def parse_spotify_url(url):
+    match = SPOTIFY_URL_RE.search(url)
+    if match is None:
+        return None, None
+    return match.group(1), match.group(2)
+
+
+class SpotifyClient:
+    API_URL = "https://api.spotify.com/v1"
+    TOKEN_URL = "https://accounts.spotify.com/api/token"
+
+    def __init__(self, client_id=None, client_secret=None, max_retries=5):
+        self.client_id = client_id or os.getenv("SPOTIFY_CLIENT_ID")
+        self.client_secret = client_secret or os.getenv("SPOTIFY_CLIENT_SECRET")
+        self.max_retries = max_retries
+        self._session = None
+        self._token = None
+        self._token_expires = 0
+        self._token_lock = asyncio.Lock()
+        # Spotify rate limits are per application, so a 429 pauses every request, not just the one that hit it.
+        self._retry_after = 0
+
+    async def _get_session(self):
+        if self._session is None or self._session.closed:
+            # trust_env picks up HTTP(S)_PROXY, same as requests did for spotipy.
+            self._session = aiohttp.ClientSession(trust_env=True)
+        return self._session
+
+    async def _get_token(self):
+        async with self._token_lock:
+            if self._token and time.monotonic() < self._token_expires - 60:
+                return self._token
+            session = await self._get_session()
+            auth = aiohttp.BasicAuth(self.client_id or "", self.client_secret or "")
+            async with session.post(self.TOKEN_URL, data={'grant_type': 'client_credentials'}, auth=auth) as resp:
+                if resp.status != 200:
+                    raise SpotifyError(f"Spotify token request failed with status {resp.status}")
+                payload = await resp.json()
+            self._token = payload['access_token']
+            self._token_expires = time.monotonic() + payload.get('expires_in', 3600)
+            return self._token
+
+    async def _request(self, url, params=None):
+        session = await self._get_session()
+        for attempt in range(self.max_retries):
+            delay = self._retry_after - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+            token = await self._get_token()
+            start = time.perf_counter()
+            async with session.get(url, params=params, headers={'Authorization': f"Bearer {token}"}) as resp:
+                SPOTIFY_REQUEST_SECONDS.observe(time.perf_counter() - start, endpoint=self._endpoint(url), status=resp.status)
+                if resp.status == 200:
+                    return await resp.json()
+                if resp.status == 429:
+                    retry_after = float(resp.headers.get('Retry-After', 1))
+                    self._retry_after = max(self._retry_after, time.monotonic() + retry_after)
+                    log.warning("Spotify rate limit hit, retrying in %.1fs", retry_after)
+                elif resp.status == 401:
+                    self._token = None
+                elif resp.status >= 500:
+                    await asyncio.sleep(2 ** attempt)
+                else:
+                    raise SpotifyError(f"Spotify API returned status {resp.status} for {url}")
+        raise SpotifyError(f"Spotify API request failed after {self.max_retries} attempts: {url}")
+
+    async def warm(self):
+        if self.client_id and self.client_secret:
+            await self._get_token()
+
+    def _endpoint(self, url):
+        # /v1/playlists/<id>/tracks -> "playlists", keeps label cardinality bounded.
+        path = url.split("/v1/", 1)[-1]
+        return path.split("/", 1)[0].split("?", 1)[0]
+
+    async def iter_tracks(self, url):
+        kind, item_id = parse_spotify_url(url)
+        if kind == "track":
+            yield await self._request(f"{self.API_URL}/tracks/{item_id}")
+            return
+
+        if kind == "album":
+            next_url = f"{self.API_URL}/albums/{item_id}/tracks"
+            params = {'limit': 50}
+        elif kind == "playlist":
+            next_url = f"{self.API_URL}/playlists/{item_id}/tracks"
+            params = {'limit': 100, 'fields': "next,items(track(type,id,name,artists(name)))"}
+        else:
+            raise SpotifyError(f"Unsupported Spotify URL: {url}")
+
+        # Tracks are yielded page by page, so callers can start on the first page while the rest is fetched.
+        while next_url:
+            page = await self._request(next_url, params)
+            for item in page.get('items', []):
+                track = item.get('track') if kind == "playlist" else item
+                if track and track.get('type', 'track') == 'track' and track.get('artists'):
+                    yield track
+            # 'next' already carries the query string.
+            next_url = page.get('next')
+            params = None
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
@@ -0,0 +1,43 @@
+import asyncio
+import os
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+
+
+class SQLiteStore:
+    # A lazily opened WAL database behind one worker thread. sqlite3 connections are not shareable
+    # across threads, so every query goes through that worker; subclasses call _run from the loop.
+    SCHEMA = ""
+
+    def __init__(self, path, thread_name_prefix):
+        self.path = path
+        self._conn = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=thread_name_prefix)
+
+    def _connect(self):
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(self.path)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(self.SCHEMA)
+        return self._conn
+
+    async def _run(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, func, *args)
+
+    def _close_connection(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    async def open(self):
+        await self._run(self._connect)
+
+    def close(self):
+        # Queued on the worker, so writes submitted before it still land.
+        self._executor.submit(self._close_connection)
+        self._executor.shutdown(wait=True)
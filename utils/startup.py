@@ -0,0 +1,160 @@
+import json
+import logging
+import os
+import signal
+import subprocess
+import sys
+import time
+import urllib.request
+
+import discord
+from discord.ext import commands
+
+from utils.metrics import STARTUP_SECONDS
+
+log = logging.getLogger(__name__)
+
+GATEWAY_BOT_URL = "https://discord.com/api/v10/gateway/bot"
+
+
+class StartupTimer:
+    def __init__(self, started=None):
+        self.started = time.perf_counter() if started is None else started
+        self.stages = {}
+
+    def mark(self, stage):
+        # Milestones are measured from process start.
+        self._record(stage, time.perf_counter() - self.started)
+
+    async def timed(self, stage, awaitable):
+        # Warm-up steps run concurrently, so each records its own duration.
+        start = time.perf_counter()
+        try:
+            return await awaitable
+        finally:
+            self._record(stage, time.perf_counter() - start)
+
+    def _record(self, stage, seconds):
+        # on_ready fires again after a reconnect; only the cold start is reported.
+        if stage in self.stages:
+            return
+        self.stages[stage] = seconds
+        STARTUP_SECONDS.set(seconds, stage=stage)
+        log.info("Startup: %s %.3fs", stage, seconds)
+
+
+def bot_intents():
+    # Slash commands arrive as interactions and need no intent; the cogs only read guilds, roles,
+    # channels and voice states. No members or presences, so nothing is chunked at startup.
+    intents = discord.Intents.none()
+    intents.guilds = True
+    intents.voice_states = True
+    return intents
+
+
+def member_cache_flags():
+    # Members in voice channels are enough: the idle check counts who is left in the bot's channel.
+    # Anyone else is fetched on demand (role expiry uses fetch_member).
+    flags = discord.MemberCacheFlags.none()
+    flags.voice = True
+    return flags
+
+
+def shard_options():
+    # Without SHARD_COUNT the library asks Discord for the recommended count; SHARD_IDS pins this
+    # process to a subset of shards (set per process in cluster mode).
+    options = {}
+    if os.getenv("SHARD_COUNT"):
+        options['shard_count'] = int(os.environ["SHARD_COUNT"])
+    if os.getenv("SHARD_IDS"):
+        if 'shard_count' not in options:
+            raise ValueError("SHARD_IDS requires SHARD_COUNT")
+        options['shard_ids'] = [int(shard_id) for shard_id in os.environ["SHARD_IDS"].split(",")]
+    return options
+
+
+def create_bot(started=None):
+    bot = commands.AutoShardedBot(
+        intents=bot_intents(),
+        member_cache_flags=member_cache_flags(),
+        chunk_guilds_at_startup=False,
+        **shard_options()
+    )
+    bot.startup = StartupTimer(started)
+    return bot
+
+
+def owns_every_guild(bot):
+    return not bot.shard_ids or not bot.shard_count or len(set(bot.shard_ids)) >= bot.shard_count
+
+
+def owns_guild(bot, guild_id):
+    # Only meaningful in cluster mode: is this guild on one of the shards this process runs?
+    # Rows that predate guild_id belong to no shard in particular, so every process takes them.
+    if owns_every_guild(bot) or guild_id is None:
+        return True
+    return (guild_id >> 22) % bot.shard_count in bot.shard_ids
+
+
+def cluster_count():
+    return int(os.getenv("CLUSTER_COUNT", 1))
+
+
+def is_cluster_launcher():
+    return cluster_count() > 1 and os.getenv("CLUSTER_ID") is None
+
+
+def recommended_shard_count(token):
+    request = urllib.request.Request(GATEWAY_BOT_URL, headers={
+        'Authorization': f"Bot {token}",
+        'User-Agent': "DiscordBot (cluster launcher, 1.0)",
+    })
+    with urllib.request.urlopen(request, timeout=30) as resp:
+        return json.load(resp)['shards']
+
+
+def cluster_environments(count, shard_count):
+    metrics_port = int(os.getenv("METRICS_PORT", 9100))
+    for cluster_id in range(count):
+        shard_ids = list(range(cluster_id, shard_count, count))
+        if not shard_ids:
+            break
+        env = dict(os.environ)
+        env.update(CLUSTER_ID=str(cluster_id), SHARD_COUNT=str(shard_count),
+                   SHARD_IDS=",".join(map(str, shard_ids)))
+        if metrics_port:
+            env['METRICS_PORT'] = str(metrics_port + cluster_id)
+        yield cluster_id, shard_ids, env
+
+
+def launch_clusters(script, token):
+    count = cluster_count()
+    shard_count = int(os.getenv("SHARD_COUNT") or 0) or recommended_shard_count(token)
+    # At least one shard per cluster; Discord's recommendation is rounded up so every cluster gets one.
+    shard_count = max(shard_count, count)
+    processes = {}
+    for cluster_id, shard_ids, env in cluster_environments(count, shard_count):
+        log.info("Starting cluster %d with shards %s of %d", cluster_id, shard_ids, shard_count)
+        processes[cluster_id] = subprocess.Popen([sys.executable, script], env=env)
+
+    def terminate(*_):
+        for process in processes.values():
+            if process.poll() is None:
+                process.terminate()
+
+    signal.signal(signal.SIGTERM, terminate)
+    signal.signal(signal.SIGINT, terminate)
+    # One cluster going down takes the others with it; the container's restart policy brings them all back.
+    try:
+        while True:
+            for cluster_id, process in processes.items():
+                code = process.poll()
+                if code is not None:
+                    log.warning("Cluster %d exited with code %d, stopping the others", cluster_id, code)
+                    terminate()
+                    for other in processes.values():
+                        other.wait()
+                    return code
+            time.sleep(1)
+    finally:
+        terminate()